@@ -1,12 +1,111 @@
 import pandas as pd
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import pickle
 import re
 import os
+import shutil
+import sqlite3
+import struct
 import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 
 # Configuration constants
 OUTPUT_DIR = os.path.join(os.getcwd(), 'processed_data')
 RULES_DIR = 'rules'  # New constant for rules directory
 RULES_FILE = os.path.join(RULES_DIR, 'USFS_MSUP_Class_2.csv')  # Updated path
+RULES_STORE_FILE = os.path.join(RULES_DIR, 'USFS_MSUP_Class_2.rules')  # Memory-mapped compiled rules
+RUBRIC_FILE = 'Biological-Review-Rubric-Template-Language.xlsx'  # Rubric workbook the rules CSV is exported from
+RUBRIC_SHEET = 'USFS MSUP (Class II)'
+
+# Output formats and the file extension each one writes
+OUTPUT_FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+    'arrow': '.arrow'
+}
+OUTPUT_CHUNK_ROWS = 10000
+CHECKPOINT_ROWS = 5000  # Rows processed between checkpoints
+
+# Optional SQLite store of processed rows, the species they matched and their RPMs
+REVIEW_DB_FILE = os.path.join(OUTPUT_DIR, 'reviews.db')
+REVIEW_DB_BATCH_ROWS = 5000  # Rows inserted per transaction
+REVIEW_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    sheet TEXT NOT NULL DEFAULT '',
+    path TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    processed_at TEXT NOT NULL,
+    review_records TEXT,
+    review TEXT,
+    rpms TEXT,
+    row_data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS review_species (
+    review_id INTEGER NOT NULL REFERENCES reviews(id) ON DELETE CASCADE,
+    species TEXT NOT NULL,
+    taxon TEXT,
+    review_number INTEGER,
+    location TEXT
+);
+CREATE TABLE IF NOT EXISTS review_rpms (
+    review_id INTEGER NOT NULL REFERENCES reviews(id) ON DELETE CASCADE,
+    rpm TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_file ON reviews(file, sheet, input_hash, row);
+CREATE INDEX IF NOT EXISTS reviews_processed_at ON reviews(processed_at);
+CREATE INDEX IF NOT EXISTS review_species_species ON review_species(species COLLATE NOCASE, review_id);
+CREATE INDEX IF NOT EXISTS review_species_review ON review_species(review_id);
+CREATE INDEX IF NOT EXISTS review_rpms_rpm ON review_rpms(rpm, review_id);
+CREATE INDEX IF NOT EXISTS review_rpms_review ON review_rpms(review_id);
+"""
+
+# Shard-and-merge mode: manifest written next to the shards of a split input
+SHARD_MANIFEST_FILE = 'manifest.json'
+SHARD_MANIFEST_VERSION = 1
+
+# Watch mode timing, in seconds
+WATCH_POLL_SECONDS = 2.0  # How often the watched folder is checked
+WATCH_SETTLE_SECONDS = 3.0  # How long a file must stay unchanged before it is processed
+
+# Input columns read as strings and the generated output columns
+REVIEW_COLUMN = 'Biological Resource Review (presence/absence, resource description if appropriate)'
+RPM_COLUMN = 'Biological RPMs'
+AUDIT_ROW_COLUMN = 'Audit Row'  # Named so it cannot collide with an input 'Row' column
+NEAREST_DISTANCE_COLUMN = 'Nearest Record Distance (ft)'  # Optional distance columns, see --distance-columns
+DISTANCES_COLUMN = 'Record Distances (ft)'
+
+# Optional provenance column, see --provenance: '<paragraph tokens>|<RPM tokens>', space separated and in
+# output order. A paragraph token is '<rules row>:<review number><flags>'; an RPM token joins the tokens
+# of every line that contributed it with '+', and '*' is the General Measures RPM added to every row.
+# Flags: w = woodpecker name prefixed, s = source text rewritten, c = critical habitat added,
+# o = outside-habitat text rewritten.
+PROVENANCE_COLUMN = 'Review Provenance'
+
+# RPMs containing this text are moved to the end as the one General Measures RPM
+GENERAL_MEASURES_TEXT = 'General Measures and Standard OMP BMPs'
+
+INPUT_DTYPES = {
+    'Review Records': str,
+    REVIEW_COLUMN: str,
+    RPM_COLUMN: str
+}
 
 def get_available_files():
     """Get list of CSV and XLSX files in current directory excluding rules file"""
@@ -63,20 +162,107 @@ TAXON_ORDER = {
     'Plants': 2,
     'Plant': 2,
     'Invertebrates': 3,
+    'Invertebrate': 3,
     'Fish': 4,
     'Amphibian': 5,
     'Reptiles': 6,
+    'Reptile': 6,
     'Bird': 7,
     '--': 7,
     'Mammal': 8
 }
 
+# A distance parsed from a location: feet for comparisons, the value and unit ('mi' or 'ft') as
+# written, and whether the record is within it (True), beyond it (False) or unqualified (None)
+Distance = namedtuple('Distance', ['feet', 'value', 'unit', 'within'])
+FEET_PER_UNIT = {'mi': 5280, 'ft': 1}
+
+# Locations within this distance of an American Marten record are reviewed as Sierra marten
+MARTEN_NEAR_FEET = 500
+
+# Numeric review rules by cleaned species name, checked in order against the distance of the
+# phrase naming the text: (within or beyond, distance in feet, text the location must mention, review number).
+# 'reproductive' entries take no distance and apply to 'Within <text>' locations that mention reproductive habitat
+DISTANCE_REVIEW_RULES = {
+    'pacific fisher': [
+        ('beyond', 650, 'CBI', 4),
+        ('within', 650, 'Critical Habitat', 1),
+        ('reproductive', None, 'CBI', 2),
+        ('within', 650, 'CBI', 3)
+    ]
+}
+
+# Position of each taxon in the output; process_single_record groups taxa by a stable sort on TAXON_ORDER
+TAXON_POSITION = {taxon: position for position, taxon in enumerate(sorted(TAXON_ORDER, key=TAXON_ORDER.get))}
+
+# Review language numbers that get_review_number can select
+REVIEW_NUMBERS = (1, 2, 3, 4)
+
+# Review numbers selected by the species-specific cases in get_review_number
+SPECIES_REVIEW_NUMBERS = {
+    'pacific fisher': (1, 2, 3, 4),
+    'yosemite toad': (1, 2, 4),
+    'sierra nevada yellow-legged frog': (1, 2)
+}
+
+# Guidance values that mean the rule has no species specific guidance
+NO_GUIDANCE_VALUES = ('--', '', ' ')
+
+REQUIRED_RULE_COLUMNS = ['Species', 'Taxon', 'Species Specific Guidance'] + \
+    [f'Review Language ({n})' for n in REVIEW_NUMBERS] + \
+    [f'RPM ({n})' for n in REVIEW_NUMBERS]
+OPTIONAL_RULE_COLUMNS = ['Scientific Name']
+
+# Cell values read as empty, matching pd.read_csv's default NA values
+RULE_NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+# Precompiled patterns used on every line
+WHITESPACE_PATTERN = re.compile(r'\s+')
+DONE_PREFIX_PATTERN = re.compile(r'^(?:Done|DONE)\s*-\s*')
+DISTANCE_TEXT = r'(\d+(?:\.\d+)?)\s*-?\s*(mi|miles?|ft|feet|foot)\b'
+DISTANCE_PATTERN = re.compile(r'\b(not within|within|outside(?: of)?)?\s*' + DISTANCE_TEXT, re.IGNORECASE)
+# Text between a distance and the name its phrase refers to: no list separator and no other distance
+PHRASE_GAP = r'(?:\s+of)?(?:(?!\d+(?:\.\d+)?\s*-?\s*(?:mi|miles?|ft|feet|foot)\b)[^,;|])*?'
+# A "within" distance whose phrase names an occurrence source, e.g. 'Within 1-mi of USFS/CNDDB'
+SOURCE_DISTANCE_PATTERN = re.compile(r'(?<!not )\b(within)\s*' + DISTANCE_TEXT + PHRASE_GAP + r'\b(?:USFS|CNDDB|SCE)\b', re.IGNORECASE)
+SOURCE_PATTERN = re.compile(r'Within (?P<distance>\d+(?:\.\d+)?-mi) of (?:a |an )?((?:CNDDB|USFS|SCE)(?:/(?:CNDDB|USFS|SCE))*) occurrence record(?:s)?')
+CRITICAL_HABITAT_PATTERN = re.compile(r'\) - Within (.*?)(:|(?=\s*\(habitat suitable\)))')
+NEAR_DUPLICATE_PATTERN = re.compile(r'[\W_]+')
+PARENTHETICAL_PATTERN = re.compile(r'\(([^()]*)\)')
+OLD_NAME_PREFIX_PATTERN = re.compile(r'^old name\s*-\s*')
+ABBREVIATED_WORD_PATTERN = re.compile(r'^\w\.$')
+
+# Compiled rules keyed by cleaned species name, set by load_rules
+rules_index = {}
+
+# Cleaned species names containing ' - ' (e.g. DPS names) and their first segments, set by load_rules
+multi_segment_names = set()
+multi_segment_prefixes = set()
+
+# Hit counters for the current run, set by process_species_records
+processing_stats = None
+
+# Print a line per record while processing; turned off in worker processes
+show_record_progress = True
+
+# SQLite database processed rows are also saved to, set by --sqlite
+review_db_path = None
+
+# Add the parsed record distances as output columns, set by --distance-columns
+add_distance_columns = False
+
+# Add the review provenance column, set by --provenance
+add_provenance_column = False
+
 def get_available_files():
-    """Get list of CSV and XLSX files in current directory excluding USFS_MSUP_Class_2.csv"""
+    """Get list of CSV and XLSX files in current directory excluding the rules CSV and rubric workbook"""
     all_files = os.listdir('.')
     valid_files = [f for f in all_files
                   if (f.endswith('.csv') or f.endswith('.xlsx'))
-                  and f != 'USFS_MSUP_Class_2.csv']
+                  and f not in ('USFS_MSUP_Class_2.csv', RUBRIC_FILE)]
     return valid_files
 
 def display_file_options(files):
@@ -98,12 +284,12 @@ def get_user_selection(files):
         except ValueError:
             print("Please enter a valid number")
 
-def convert_xlsx_to_csv(xlsx_file):
-    """Convert XLSX file to CSV"""
+def convert_xlsx_to_csv(xlsx_file, sheet_name=0):
+    """Convert one sheet of an XLSX file (the first by default) to CSV"""
     print(f"\nConverting {xlsx_file} to CSV...")
     
     # Read XLSX
-    df = pd.read_excel(xlsx_file)
+    df = pd.read_excel(xlsx_file, sheet_name=sheet_name)
     
     # Create CSV filename
     csv_file = xlsx_file.rsplit('.', 1)[0] + '.csv'
@@ -124,10 +310,137 @@ def ensure_output_directory():
             print(f"Error creating output directory: {e}")
             raise
 
+def get_output_file(input_file, output_format='csv'):
+    """Build the processed output path for an input file"""
+    output_filename = os.path.basename(input_file).rsplit('.', 1)[0] + '_processed' + OUTPUT_FORMATS[output_format]
+    return os.path.join(OUTPUT_DIR, output_filename)
+
+def strip_output_extension(output_file):
+    """Remove the output format extension from an output path"""
+    for extension in sorted(OUTPUT_FORMATS.values(), key=len, reverse=True):
+        if output_file.endswith(extension):
+            return output_file[:-len(extension)]
+    return output_file.rsplit('.', 1)[0]
+
+def iter_output_chunks(df, chunk_rows=OUTPUT_CHUNK_ROWS):
+    """Split a DataFrame into row chunks for writing"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def open_text_output(path, output_format):
+    """Open a text stream for a CSV output format, compressing if needed"""
+    if output_format == 'csv':
+        return open(path, 'w', newline='', encoding='utf-8')
+    if output_format == 'csv.gz':
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    if output_format == 'csv.zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The csv.zst output format requires the zstandard package (pip install zstandard)")
+        raw = open(path, 'wb')
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), newline='', encoding='utf-8')
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+def arrow_table(chunk, schema=None):
+    """Convert a DataFrame chunk to an Arrow table, keeping the first chunk's schema"""
+    import pyarrow as pa
+
+    if schema is not None:
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    # Columns that are empty in the first chunk have no type yet; store them as strings
+    fields = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+def write_columnar_chunks(chunks, path, output_format):
+    """Write DataFrame chunks to a Parquet or Arrow IPC file"""
+    try:
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(f"The {output_format} output format requires the pyarrow package (pip install pyarrow)")
+
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            table = arrow_table(chunk, schema)
+            if writer is None:
+                schema = table.schema
+                if output_format == 'parquet':
+                    writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+                else:
+                    writer = pyarrow.ipc.new_file(path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def time_chunks(chunks, timer):
+    """Pass chunks through, adding the time spent producing them to timer['producing']"""
+    iterator = iter(chunks)
+    while True:
+        start_time = time.perf_counter()
+        chunk = next(iterator, None)
+        timer['producing'] += time.perf_counter() - start_time
+        if chunk is None:
+            return
+        yield chunk
+
+def write_output_chunks(chunks, output_file, output_format='csv'):
+    """Stream DataFrame chunks to a temporary file and rename it into place when complete
+
+    The reported throughput excludes time spent producing the chunks, so it measures the
+    writer alone even when chunks are generated while writing.
+    """
+    start_time = time.perf_counter()
+    timer = {'producing': 0.0}
+    chunks = time_chunks(chunks, timer)
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    fd, temp_file = tempfile.mkstemp(dir=output_dir, prefix='.' + os.path.basename(output_file) + '.', suffix='.tmp')
+    os.close(fd)
+
+    rows = 0
+    try:
+        if output_format in ('parquet', 'arrow'):
+            rows = write_columnar_chunks(chunks, temp_file, output_format)
+        else:
+            with open_text_output(temp_file, output_format) as f:
+                header = True
+                for chunk in chunks:
+                    chunk.to_csv(f, index=False, header=header)
+                    header = False
+                    rows += len(chunk)
+        # mkstemp creates the file owner-only; give it the usual permissions before renaming
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_file, 0o666 & ~umask)
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    elapsed = max(time.perf_counter() - start_time - timer['producing'], 1e-9)
+    size = os.path.getsize(output_file)
+    size_mb = size / (1024 * 1024)
+    print(f"Wrote {rows} rows ({size_mb:.1f} MB) in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s, {size_mb / elapsed:.1f} MB/s)")
+    return {'rows': rows, 'bytes': size, 'seconds': elapsed}
+
+def write_output(df, output_file, output_format='csv'):
+    """Write a processed DataFrame in the requested output format"""
+    return write_output_chunks(iter_output_chunks(df), output_file, output_format)
+
+@lru_cache(maxsize=65536)
 def clean_species_name(name):
     """Clean up species name for matching"""
     if isinstance(name, str):
-        return re.sub(r'\s+', ' ', name.strip().lower())
+        return WHITESPACE_PATTERN.sub(' ', name.strip().lower())
     return ''
 
 def standardize_species_name(species_name):
@@ -139,16 +452,70 @@ def standardize_species_name(species_name):
     if 'woodpecker' in species_name.lower():
         return '00_Woodpeckers'
         
-    # Check for direct mappings
-    if species_name in SPECIES_NAME_MAPPINGS:
-        return SPECIES_NAME_MAPPINGS[species_name]
+    # SPECIES_NAME_MAPPINGS and scientific names are resolved by the alias index built in compile_rules
         
     # Check for American Marten within 500 ft
-    if 'American Marten' in species_name and re.search(r'within.*?500.*?ft', species_name.lower()):
-        return species_name.replace('American Marten', 'Sierra marten')
+    if 'American Marten' in species_name:
+        distance = parse_location_distance(species_name)
+        if distance is not None and distance.within and distance.feet <= MARTEN_NEAR_FEET:
+            return species_name.replace('American Marten', 'Sierra marten')
         
     return species_name
 
+def distance_from_match(match):
+    """Distance from a (qualifier, value, unit) pattern match"""
+    qualifier, value, unit = match.groups()
+    unit = 'mi' if unit.lower().startswith('mi') else 'ft'
+    within = None if qualifier is None else qualifier.lower() == 'within'
+    return Distance(float(value) * FEET_PER_UNIT[unit], float(value), unit, within)
+
+@lru_cache(maxsize=65536)
+def parse_location_distances(location_info):
+    """Parse every distance in a location, e.g. 'Within 650-ft of CBI, Within 1-mi of USFS'"""
+    return tuple(distance_from_match(match) for match in DISTANCE_PATTERN.finditer(location_info))
+
+def parse_location_distance(location_info):
+    """Parse the first distance in a location, e.g. 'Not within 650-ft of CBI', or return None"""
+    distances = parse_location_distances(location_info)
+    return distances[0] if distances else None
+
+@lru_cache(maxsize=65536)
+def parse_source_distance(location_info):
+    """Parse the distance of the phrase naming a USFS/CNDDB/SCE record, or return None"""
+    match = SOURCE_DISTANCE_PATTERN.search(location_info)
+    return distance_from_match(match) if match else None
+
+def format_distance(distance):
+    """Write a distance the way review language does, e.g. '1.5-mi' or '650-ft'"""
+    return f"{distance.value:g}-{distance.unit}"
+
+@lru_cache(maxsize=65536)
+def parse_phrase_distance(location_info, text):
+    """Parse the distance of the phrase naming text, e.g. CBI in 'Within 1-mi of USFS, Within 650-ft of CBI'.
+    Falls back to the location's first distance when no distance phrase names the text"""
+    pattern = re.compile(r'\b(not within|within|outside(?: of)?)?\s*' + DISTANCE_TEXT + PHRASE_GAP + r'\b' + re.escape(text), re.IGNORECASE)
+    match = pattern.search(location_info)
+    return distance_from_match(match) if match else parse_location_distance(location_info)
+
+def distance_review_number(species_name, location_info):
+    """Review number from the species' numeric distance rules, or None if none applies"""
+    for comparison, feet, required_text, review_num in DISTANCE_REVIEW_RULES.get(species_name, ()):
+        if required_text not in location_info:
+            continue
+        if comparison == 'reproductive':
+            if f'Within {required_text}' in location_info and 'reproductive' in location_info.lower():
+                return review_num
+            continue
+        distance = parse_phrase_distance(location_info, required_text)
+        if distance is None or distance.within is None:
+            continue
+        # 'Not within 650-ft' is only beyond a 650-ft threshold if its own distance is at least that far
+        if comparison == 'within' and distance.within and distance.feet <= feet:
+            return review_num
+        if comparison == 'beyond' and not distance.within and distance.feet >= feet:
+            return review_num
+    return None
+
 def should_process_species(species_name):
     """Check if species should be processed based on exclusion list"""
     return not any(excluded in species_name.lower() for excluded in EXCLUDED_SPECIES)
@@ -169,18 +536,20 @@ def modify_source_text(review_lang, location_info):
     if not sources:
         return review_lang
 
-    source_pattern = r'Within \d+(?:\.\d+)?-mi of (?:a |an )?((?:CNDDB|USFS|SCE)(?:/(?:CNDDB|USFS|SCE))*) occurrence record(?:s)?'
-    match = re.search(source_pattern, review_lang)
+    match = SOURCE_PATTERN.search(review_lang)
     
     if match:
         sources.sort()
         source_text = '/'.join(sources)
+        # Use the distance the location reports for the source, falling back to the rubric's own buffer
+        distance = parse_source_distance(location_info)
+        distance_text = format_distance(distance) if distance is not None else match.group('distance')
         if len(sources) == 1:
-            replacement = f'Within 1-mi of a {source_text} occurrence record'
+            replacement = f'Within {distance_text} of a {source_text} occurrence record'
         else:
-            replacement = f'Within 1-mi of {source_text} occurrence records'
+            replacement = f'Within {distance_text} of {source_text} occurrence records'
             
-        review_lang = re.sub(source_pattern, replacement, review_lang)
+        review_lang = SOURCE_PATTERN.sub(replacement, review_lang)
 
     return review_lang
 
@@ -189,7 +558,7 @@ def modify_review_language_for_critical_habitat(review_lang, location_info):
     if 'Critical Habitat' in location_info:
         if 'Critical Habitat' not in review_lang:
             # Match text with or without colon before (habitat suitable)
-            match = re.search(r'\) - Within (.*?)(:|(?=\s*\(habitat suitable\)))', review_lang)
+            match = CRITICAL_HABITAT_PATTERN.search(review_lang)
             if match:
                 original_text = match.group(1)
                 modified_text = f"{original_text} and USFWS Critical Habitat"
@@ -199,15 +568,22 @@ def modify_review_language_for_critical_habitat(review_lang, location_info):
                     review_lang = review_lang.replace(original_text, modified_text)
     return review_lang
 
+def count_default_review(rule, reason):
+    """Record that a line fell back to Review Language (1) by default"""
+    if processing_stats is not None:
+        processing_stats['default_review'][(rule['species'], reason)] += 1
+
 def get_review_number(species_name, location_info, rule):
     """Determine which review language number to use"""
     species_name = clean_species_name(species_name)
 
     # If location_info is None, empty string, or only whitespace, return 1
     if not location_info or not location_info.strip():
+        count_default_review(rule, 'no location')
         return 1
 
-    if pd.isna(rule['Species Specific Guidance']) or rule['Species Specific Guidance'] in ['--', '', ' ']:
+    if not rule['has_guidance']:
+        count_default_review(rule, 'no guidance')
         return 1
 
     # Yosemite Toad special cases
@@ -229,46 +605,72 @@ def get_review_number(species_name, location_info, rule):
     if species_name == '00_woodpeckers':
         return 1
 
+    review_num = distance_review_number(species_name, location_info)
+    if review_num is not None:
+        return review_num
+
+    distance = parse_location_distance(location_info)
+
     if 'pacific fisher' in species_name:
         if 'Not within' in location_info and 'CBI' in location_info:
             return 4
-        elif 'Within 650-ft' in location_info and 'Critical Habitat' in location_info:
-            return 1
-        elif 'Within CBI' in location_info and 'reproductive' in location_info.lower():
-            return 2
-        elif 'Within 650-ft' in location_info and 'CBI' in location_info:
-            return 3
 
-    elif 'USFS' in location_info and re.search(r'\d+\.\d+-mi', location_info):
+    elif 'USFS' in location_info and distance is not None and distance.within:
         return 1
 
+    count_default_review(rule, 'no matching case')
     return 1
 
-def get_review_language(species, location_info, rule, original_species=None):
-    """Get appropriate review language and RPM based on guidance"""
+def get_review_language(species, location_info, rule, original_species=None, review_num=None, provenance=None):
+    """Get appropriate review language and RPMs based on guidance
+
+    If provenance is a list, the provenance of the line is appended to it (see line_provenance).
+    """
     if rule is None:
-        return None, None
+        return None, ()
 
-    review_num = get_review_number(species, location_info, rule)
-    if review_num:
-        review_col = f'Review Language ({review_num})'
-        rpm_col = f'RPM ({review_num})'
+    if review_num is None:
+        review_num = get_review_number(species, location_info, rule)
+    if processing_stats is not None:
+        processing_stats['review_numbers'][(rule['species'], review_num)] += 1
 
-        review = rule[review_col] if pd.notna(rule[review_col]) else None
-        rpm = rule[rpm_col] if pd.notna(rule[rpm_col]) else None
+    if review_num:
+        review = rule['review'][review_num]
+        rpm = rule['rpms'][review_num]
+        flags = ''
 
         if review:
             # For woodpeckers, prepend the original species name
             if species == '00_Woodpeckers' and original_species:
                 review = f"{original_species} - {review}"
-            
-            review = modify_source_text(review, location_info)
-            review = modify_review_language_for_critical_habitat(review, location_info)
-            review = modify_outside_habitat_text(review, location_info)
+                flags = 'w'
+
+            if provenance is None:
+                review = modify_source_text(review, location_info)
+                review = modify_review_language_for_critical_habitat(review, location_info)
+                review = modify_outside_habitat_text(review, location_info)
+            else:
+                # The same modifiers, noting the provenance flag of each one that changed the text
+                modified = modify_source_text(review, location_info)
+                if modified != review:
+                    flags += 's'
+                review = modify_review_language_for_critical_habitat(modified, location_info)
+                if review != modified:
+                    flags += 'c'
+                modified = modify_outside_habitat_text(review, location_info)
+                if modified != review:
+                    flags += 'o'
+                review = modified
+
+        if provenance is not None:
+            try:
+                provenance.append(rule['provenance'][review_num][flags])
+            except KeyError:
+                provenance.append(line_provenance(rule, review_num, flags))
         
         return review, rpm
         
-    return None, None
+    return None, ()
 
 def modify_outside_habitat_text(review_lang, location_info):
     """Modify review language to handle 'Outside of' cases"""
@@ -286,8 +688,97 @@ def modify_outside_habitat_text(review_lang, location_info):
     
     return review_lang
 
-def process_single_record(review_records):
-    """Process a single review records entry"""
+def split_species_location(line):
+    """Split a review line into the species name and its location information"""
+    species, separator, location = line.partition(' - ')
+    if not separator:
+        return species.strip(), ''
+
+    # Multi-segment names such as 'California spotted owl - Sierra Nevada DPS' keep their
+    # extra segments; try the longest known name first
+    if clean_species_name(species) in multi_segment_prefixes:
+        parts = line.split(' - ')
+        for end in range(len(parts), 1, -1):
+            candidate = ' - '.join(parts[:end])
+            if clean_species_name(candidate) in multi_segment_names:
+                return candidate.strip(), ' - '.join(parts[end:]).strip()
+
+    return species.strip(), location.strip()
+
+def tokenize_review_records(review_records):
+    """Split a Review Records cell into (original species, location) pairs"""
+    pairs = []
+    # splitlines handles the \r\n line endings in Excel exports
+    for line in review_records.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        # Clean up line by removing "Done - " or "DONE - " prefixes
+        if line[:4] in ('Done', 'DONE'):
+            line = DONE_PREFIX_PATTERN.sub('', line)
+        pairs.append(split_species_location(line))
+    return pairs
+
+def line_provenance(rule, review_num, flags):
+    """Provenance of a line, formatted on first use and kept with the rule
+
+    It is the token, the token again if the line adds review language (else ''), its RPM tokens
+    when it is the only line of its taxon, and its distinct RPMs other than General Measures.
+    """
+    token = f"{rule['row']}:{review_num}{flags}"
+    specific_rpms = frozenset(rpm for rpm in rule['rpms'][review_num] if GENERAL_MEASURES_TEXT not in rpm)
+    line = (token, token if rule['review'][review_num] else '', ' '.join([token] * len(specific_rpms)), specific_rpms)
+    rule.setdefault('provenance', {}).setdefault(review_num, {})[flags] = line
+    return line
+
+@lru_cache(maxsize=65536)
+def merge_provenance_lines(lines):
+    """Paragraph and RPM tokens of the lines of one taxon, joining the tokens of every line that
+    contributed each RPM
+
+    A taxon only has a few distinct combinations of lines, so each is merged once.
+    """
+    rpm_sources = {}
+    for token, _, _, specific_rpms in lines:
+        for rpm in specific_rpms:
+            tokens = rpm_sources.setdefault(rpm, [])
+            if token not in tokens:
+                tokens.append(token)
+    paragraph_text = ' '.join([paragraph_token for _, paragraph_token, _, _ in lines if paragraph_token])
+    return paragraph_text, ' '.join(['+'.join(rpm_sources[rpm]) for rpm in sorted(rpm_sources)])
+
+def encode_provenance(taxon_lines, has_rpms):
+    """Encode the provenance of the matched lines of each taxon, see PROVENANCE_COLUMN
+
+    Each line's tokens are formatted once, so a cell is a join of cached strings.
+    """
+    paragraph_parts = []
+    rpm_parts = []
+    taxa = sorted(taxon_lines, key=TAXON_POSITION.__getitem__) if len(taxon_lines) > 1 else taxon_lines
+    for taxon in taxa:
+        lines = taxon_lines[taxon]
+        if len(lines) == 1:
+            _, paragraph_text, rpm_text, _ = lines[0]
+        else:
+            paragraph_text, rpm_text = merge_provenance_lines(tuple(lines))
+        if paragraph_text:
+            paragraph_parts.append(paragraph_text)
+        if rpm_text:
+            rpm_parts.append(rpm_text)
+
+    if has_rpms:
+        rpm_parts.append('*')
+    if not paragraph_parts and not rpm_parts:
+        return ''
+    return ' '.join(paragraph_parts) + '|' + ' '.join(rpm_parts)
+
+def process_single_record(review_records, matches=None, provenance=None):
+    """Process a single review records entry
+
+    If matches is a list, (species, taxon, review number, location) is appended for each matched line.
+    If provenance is a list, the encoded provenance of the output is appended (see PROVENANCE_COLUMN).
+    """
     if pd.isna(review_records) or not review_records:
         return None, None
 
@@ -295,49 +786,43 @@ def process_single_record(review_records):
     taxon_groups = {taxon: [] for taxon in TAXON_ORDER.keys()}
     taxon_rpms = {taxon: set() for taxon in TAXON_ORDER.keys()}  # New dictionary for RPMs by taxon
 
-    for line in review_records.split('\n'):
-        if not line.strip():
-            continue
-            
-        # Clean up line by removing "Done - " or "DONE - " prefixes
-        line = re.sub(r'^(?:Done|DONE)\s*-\s*', '', line.strip())
-
-        # Handle California Spotted Owl special case first
-        if 'California Spotted Owl' in line and ' - ' in line:
-            parts = line.split(' - ')
-            original_species = (parts[0] + ' - ' + parts[1]).strip()
-            location = ' - '.join(parts[2:]) if len(parts) > 2 else ''
-        else:
-            # Handle all other cases
-            parts = line.split(' - ', 1)
-            if len(parts) == 1:
-                original_species = parts[0].strip()
-                location = ''
-            else:
-                original_species = parts[0].strip()
-                location = parts[1].strip()
+    # Provenance of the matched lines by taxon, beside taxon_groups and taxon_rpms
+    taxon_lines = None if provenance is None else {}
+    lines = None
 
+    for original_species, location in tokenize_review_records(review_records):
         standardized_species = standardize_species_name(original_species)
         
         if not should_process_species(standardized_species):
+            if processing_stats is not None:
+                processing_stats['excluded'][standardized_species] += 1
             continue
             
-        matching_rules = rules_df[rules_df['Species'].apply(lambda x:
-            clean_species_name(x) == clean_species_name(standardized_species))]
+        # Rules are validated at load time, so every indexed rule has a known taxon
+        rule = rules_index.get(clean_species_name(standardized_species))
+
+        if processing_stats is not None:
+            if rule is None:
+                processing_stats['unmatched'][standardized_species] += 1
+            else:
+                processing_stats['species'][rule['species']] += 1
+                processing_stats['taxa'][rule['taxon']] += 1
             
-        if not matching_rules.empty:
-            rule = matching_rules.iloc[0]
-            review_lang, rpm = get_review_language(standardized_species, location, rule, original_species=original_species)
-            taxon = rule['Taxon']
-                
-            if review_lang and pd.notna(review_lang):
-                if taxon in taxon_groups:
-                    taxon_groups[taxon].append(review_lang)
+        if rule is not None:
+            # Use the rule's own name so species-specific cases apply however the line named it
+            review_num = get_review_number(rule['species'], location, rule)
+            taxon = rule['taxon']
+            if taxon_lines is not None:
+                lines = taxon_lines.setdefault(taxon, [])
+            review_lang, rpms = get_review_language(rule['species'], location, rule, original_species=original_species,
+                                                    review_num=review_num, provenance=lines)
+            if matches is not None:
+                matches.append((rule['species'], taxon, review_num, location))
+            if review_lang:
+                taxon_groups[taxon].append(review_lang)
                     
-            if rpm and pd.notna(rpm):
-                rpms = [r.strip() for r in rpm.split(';') if r.strip()]
-                if taxon in taxon_rpms:
-                    taxon_rpms[taxon].update(rpms)
+            if rpms:
+                taxon_rpms[taxon].update(rpms)
 
     # Combine reviews in taxonomic order
     reviews = []
@@ -357,45 +842,1451 @@ def process_single_record(review_records):
     final_rpms = None
     if rpms_ordered:  # Using the ordered RPMs list
         # Remove any General Measures that might be in the middle
-        rpms_ordered = [rpm for rpm in rpms_ordered if 'General Measures and Standard OMP BMPs' not in rpm]
+        rpms_ordered = [rpm for rpm in rpms_ordered if GENERAL_MEASURES_TEXT not in rpm]
         # Add General Measures at the end
         rpms_ordered.append('General Measures and Standard OMP BMPs.')
         final_rpms = ';\n'.join(rpms_ordered)
+
+    if taxon_lines:
+        provenance.append(encode_provenance(taxon_lines, final_rpms is not None))
     
     return final_review, final_rpms
 
-def process_species_records(input_csv_path, rules_csv_path=RULES_FILE):
+def rule_value(value):
+    """Return a rules cell as a string, or None if it is empty"""
+    if pd.isna(value):
+        return None
+    return value
+
+def validate_rules(rules_df):
+    """Check the rules table for problems that would otherwise surface during processing"""
+    errors = []
+    warnings = []
+
+    missing_columns = [col for col in REQUIRED_RULE_COLUMNS if col not in rules_df.columns]
+    if missing_columns:
+        errors.append(f"Missing required columns: {', '.join(missing_columns)}")
+        return errors, warnings
+
+    seen_names = {}
+    near_names = {}
+    scientific_species = {}
+    for idx, rule in rules_df.iterrows():
+        row_label = f"Row {idx + 2}"
+        species = rule['Species']
+        if pd.isna(species) or not species.strip():
+            warnings.append(f"{row_label}: empty species name")
+            continue
+
+        taxon = rule['Taxon']
+        if pd.isna(taxon):
+            warnings.append(f"{row_label}: '{species}' has no taxon (e.g. #N/A) and will never be reported")
+        elif taxon not in TAXON_ORDER:
+            warnings.append(f"{row_label}: '{species}' has unknown taxon '{taxon}' and will never be reported")
+
+        cleaned = clean_species_name(species)
+        for scientific in scientific_name_aliases(rule.get('Scientific Name')):
+            scientific_species.setdefault(scientific, set()).add(cleaned)
+
+        if cleaned in seen_names:
+            warnings.append(f"{row_label}: '{species}' duplicates {seen_names[cleaned]} and will be ignored")
+        else:
+            seen_names[cleaned] = f"row {idx + 2}"
+
+            near_key = NEAR_DUPLICATE_PATTERN.sub('', cleaned)
+            if near_key in near_names:
+                warnings.append(f"{row_label}: '{species}' is a near-duplicate of '{near_names[near_key]}'")
+            else:
+                near_names[near_key] = species
+
+        for review_num in SPECIES_REVIEW_NUMBERS.get(cleaned, ()):
+            if pd.isna(rule[f'Review Language ({review_num})']):
+                warnings.append(f"{row_label}: '{species}' has no Review Language ({review_num}) for its species-specific case")
+
+        guidance = rule['Species Specific Guidance']
+        mentions_critical_habitat = isinstance(guidance, str) and 'Critical Habitat' in guidance
+        for review_num in REVIEW_NUMBERS:
+            review = rule[f'Review Language ({review_num})']
+            if pd.isna(review):
+                continue
+            if 'occurrence record' in review and 'Within' in review and not SOURCE_PATTERN.search(review):
+                warnings.append(f"{row_label}: '{species}' Review Language ({review_num}) mentions occurrence records but does not match the source pattern")
+            if mentions_critical_habitat and 'Critical Habitat' not in review and not CRITICAL_HABITAT_PATTERN.search(review):
+                warnings.append(f"{row_label}: '{species}' Review Language ({review_num}) does not match the critical habitat pattern")
+
+    for scientific, names in scientific_species.items():
+        if len(names) > 1:
+            warnings.append(f"Scientific name '{scientific}' is shared by {len(names)} species and will not be used as an alias")
+        elif scientific in seen_names and scientific not in names:
+            warnings.append(f"Scientific name '{scientific}' is also another rule's species name; the species name wins")
+
+    for original, mapped in SPECIES_NAME_MAPPINGS.items():
+        mapped = clean_species_name(mapped)
+        if mapped not in seen_names and len(scientific_species.get(mapped, ())) != 1:
+            warnings.append(f"Species mapping '{original}' -> '{mapped}' does not match any rule")
+
+    return errors, warnings
+
+def is_alias_name(name):
+    """Check whether a cleaned name is a real name rather than a placeholder such as '--'"""
+    return any(char.isalpha() for char in name)
+
+def scientific_name_aliases(value):
+    """Cleaned aliases from a Scientific Name cell
+
+    The name outside parentheses is the main alias. Parenthetical synonyms such as
+    '(old name - Martes pennanti)' are added when they are full names rather than
+    abbreviations like '(Arabis p.)' or single epithets.
+    """
+    cleaned = clean_species_name(value)
+    main_name = PARENTHETICAL_PATTERN.sub(' ', cleaned).split('(', 1)[0]
+    aliases = [clean_species_name(main_name)]
+
+    for note in PARENTHETICAL_PATTERN.findall(cleaned):
+        synonym = OLD_NAME_PREFIX_PATTERN.sub('', note.strip())
+        words = synonym.split()
+        if len(words) >= 2 and not any(ABBREVIATED_WORD_PATTERN.match(word) for word in words):
+            aliases.append(clean_species_name(synonym))
+
+    return [alias for alias in aliases if is_alias_name(alias)]
+
+def compile_rules(rules_df):
+    """Build the alias index used by process_single_record
+
+    Cleaned common names, scientific names and SPECIES_NAME_MAPPINGS keys all map to the same
+    compiled rule, so resolving a line is one dictionary lookup however many aliases exist.
+    """
+    index = {}
+    scientific_rules = {}
+    for idx, rule in zip(rules_df.index, rules_df.to_dict('records')):
+        cleaned = clean_species_name(rule['Species'])
+        if not cleaned:
+            continue
+
+        scientific_names = scientific_name_aliases(rule.get('Scientific Name'))
+        if cleaned in index:
+            for scientific in scientific_names:
+                scientific_rules.setdefault(scientific, {})[id(index[cleaned])] = index[cleaned]
+            continue
+
+        guidance = rule_value(rule['Species Specific Guidance'])
+        rpms = {}
+        for review_num in REVIEW_NUMBERS:
+            rpm = rule_value(rule[f'RPM ({review_num})'])
+            rpms[review_num] = tuple(r.strip() for r in rpm.split(';') if r.strip()) if rpm else ()
+
+        index[cleaned] = {
+            'row': int(idx) + 2,  # Row in the rules sheet, as reported by validate_rules
+            'species': rule['Species'],
+            'taxon': rule['Taxon'],
+            'has_guidance': guidance is not None and guidance not in NO_GUIDANCE_VALUES,
+            'review': {n: rule_value(rule[f'Review Language ({n})']) for n in REVIEW_NUMBERS},
+            'rpms': rpms
+        }
+        for scientific in scientific_names:
+            scientific_rules.setdefault(scientific, {})[id(index[cleaned])] = index[cleaned]
+
+    # The first row for a name wins, so drop names whose first row has an unknown taxon
+    index = {name: rule for name, rule in index.items() if rule['taxon'] in TAXON_ORDER}
+
+    # Scientific names shared by several species are ambiguous and left out
+    for scientific, rules in scientific_rules.items():
+        if len(rules) == 1 and scientific not in index:
+            rule = next(iter(rules.values()))
+            if rule['taxon'] in TAXON_ORDER:
+                index[scientific] = rule
+
+    # Configured synonyms resolve through the names above and take precedence over them
+    for original, mapped in SPECIES_NAME_MAPPINGS.items():
+        rule = index.get(clean_species_name(mapped))
+        if rule is not None:
+            index[clean_species_name(original)] = rule
+
+    return index
+
+def find_multi_segment_names(species_names):
+    """Collect cleaned names that contain ' - ' and the first segment of each"""
+    names = {clean_species_name(name) for name in species_names if isinstance(name, str) and ' - ' in name}
+    prefixes = {name.split(' - ', 1)[0].strip() for name in names}
+    return names, prefixes
+
+def normalize_column_name(name):
+    """Normalize a column header for matching, as in tools/normalize-column-names.py"""
+    return str(name).strip().lower()
+
+def rename_rule_columns(columns):
+    """Map each header to its canonical rules column name where one matches after normalizing"""
+    canonical = {normalize_column_name(col): col for col in REQUIRED_RULE_COLUMNS + OPTIONAL_RULE_COLUMNS}
+    return [canonical.get(normalize_column_name(col), col) for col in columns]
+
+def is_rubric_workbook(rules_path):
+    """Check whether a rules path is a rubric workbook rather than an exported CSV"""
+    return rules_path.lower().endswith('.xlsx')
+
+def read_rubric_rules(xlsx_path, sheet_name=RUBRIC_SHEET):
+    """Stream the rules columns from the rubric workbook sheet without loading the rest"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Sheet '{sheet_name}' not found in rubric workbook '{xlsx_path}'")
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = rename_rule_columns(next(rows, ()))
+        wanted = [(idx, col) for idx, col in enumerate(header) if col in REQUIRED_RULE_COLUMNS + OPTIONAL_RULE_COLUMNS]
+
+        records = []
+        row_numbers = []
+        for row_number, row in enumerate(rows, start=2):
+            values = []
+            for idx, _ in wanted:
+                value = row[idx] if idx < len(row) else None
+                value = None if value is None else str(value)
+                values.append(None if value in RULE_NA_VALUES else value)
+            if any(value is not None for value in values):
+                records.append(values)
+                row_numbers.append(row_number)
+    finally:
+        workbook.close()
+
+    # Index like a CSV read (sheet row - 2) so rule rows are reported as they appear in the sheet
+    return pd.DataFrame(records, columns=[col for _, col in wanted], index=[n - 2 for n in row_numbers], dtype=object)
+
+def read_rules_table(rules_path=RULES_FILE):
+    """Read the rules from the exported CSV or directly from the rubric workbook"""
+    if is_rubric_workbook(rules_path):
+        return read_rubric_rules(rules_path)
+    rules_df = pd.read_csv(rules_path, dtype=str)
+    rules_df.columns = rename_rule_columns(rules_df.columns)
+    return rules_df
+
+def compile_rules_file(rules_csv_path=RULES_FILE, verbose=True):
+    """Read, validate and compile the rules CSV or rubric workbook"""
+    rules_df = read_rules_table(rules_csv_path)
+
+    errors, warnings = validate_rules(rules_df)
+    if errors:
+        raise ValueError(f"Invalid rules file '{rules_csv_path}': " + '; '.join(errors))
+    if verbose:
+        for warning in warnings:
+            print(f"Rules warning: {warning}")
+
+    return compile_rules(rules_df)
+
+# Rules store layout: header, fixed-size rule records, fixed-size name records, then a
+# UTF-8 string blob. Records point into the blob with (offset, length) pairs.
+RULES_STORE_MAGIC = b'BRRS'
+RULES_STORE_VERSION = 3
+RULES_STORE_HEADER = struct.Struct('<4sIII32s')  # magic, version, rule count, name count, source SHA-256
+RULES_STORE_RULE = struct.Struct('<II' + 'II' * (2 + 2 * len(REVIEW_NUMBERS)))  # flags, rules row, species, taxon, reviews, RPMs
+RULES_STORE_NAME = struct.Struct('<III')  # name offset, name length, rule id
+RULES_STORE_NULL = 0xFFFFFFFF
+RULES_STORE_HAS_GUIDANCE = 1
+
+def file_sha256(path):
+    """Hash a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+def build_rules_store(index, store_path=RULES_STORE_FILE, source_hash=b'\0' * 32):
+    """Write a compiled rules index to a memory-mappable rules store file"""
+    blob = bytearray()
+
+    def add_string(value):
+        if value is None:
+            return 0, RULES_STORE_NULL
+        data = value.encode('utf-8')
+        offset = len(blob)
+        blob.extend(data)
+        return offset, len(data)
+
+    rule_ids = {}
+    rule_records = []
+    name_records = []
+    for name, rule in index.items():
+        if id(rule) not in rule_ids:
+            rule_ids[id(rule)] = len(rule_records)
+            fields = [rule['species'], rule['taxon']]
+            fields += [rule['review'][n] for n in REVIEW_NUMBERS]
+            fields += [';'.join(rule['rpms'][n]) if rule['rpms'][n] else None for n in REVIEW_NUMBERS]
+            refs = []
+            for value in fields:
+                refs.extend(add_string(value))
+            flags = RULES_STORE_HAS_GUIDANCE if rule['has_guidance'] else 0
+            rule_records.append(RULES_STORE_RULE.pack(flags, rule['row'], *refs))
+        offset, length = add_string(name)
+        name_records.append(RULES_STORE_NAME.pack(offset, length, rule_ids[id(rule)]))
+
+    store_dir = os.path.dirname(os.path.abspath(store_path))
+    fd, temp_file = tempfile.mkstemp(dir=store_dir, prefix='.' + os.path.basename(store_path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(RULES_STORE_HEADER.pack(RULES_STORE_MAGIC, RULES_STORE_VERSION,
+                                            len(rule_records), len(name_records), source_hash))
+            f.writelines(rule_records)
+            f.writelines(name_records)
+            f.write(blob)
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, store_path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    print(f"Built rules store {store_path}: {len(rule_records)} rules, {len(name_records)} names, {len(blob) / 1024:.0f} KB of text")
+    return store_path
+
+def read_rules_store_header(store_path):
+    """Read a rules store header, or return None if the file is missing or not a rules store"""
+    try:
+        with open(store_path, 'rb') as f:
+            header = f.read(RULES_STORE_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < RULES_STORE_HEADER.size:
+        return None
+    magic, version, rule_count, name_count, source_hash = RULES_STORE_HEADER.unpack(header)
+    if magic != RULES_STORE_MAGIC or version != RULES_STORE_VERSION:
+        return None
+    return {'rule_count': rule_count, 'name_count': name_count, 'source_hash': source_hash}
+
+class MappedRules:
+    """Read-only rules index backed by a memory-mapped rules store
+
+    Every process that opens the same store shares its pages, so only the name lookup
+    table and the rules actually used are held in per-process memory.
+    """
+
+    def __init__(self, store_path=RULES_STORE_FILE):
+        header = read_rules_store_header(store_path)
+        if header is None:
+            raise ValueError(f"'{store_path}' is not a rules store (version {RULES_STORE_VERSION})")
+        self.store_path = store_path
+        self.rule_count = header['rule_count']
+        self.source_hash = header['source_hash']
+
+        with open(store_path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.rules_offset = RULES_STORE_HEADER.size
+        names_offset = self.rules_offset + self.rule_count * RULES_STORE_RULE.size
+        self.blob_offset = names_offset + header['name_count'] * RULES_STORE_NAME.size
+
+        self.names = {}
+        for offset, length, rule_id in RULES_STORE_NAME.iter_unpack(self.buffer[names_offset:self.blob_offset]):
+            self.names[self.read_string(offset, length)] = rule_id
+        self.rules = {}
+
+    def read_string(self, offset, length):
+        """Decode a string from the blob"""
+        if length == RULES_STORE_NULL:
+            return None
+        start = self.blob_offset + offset
+        return self.buffer[start:start + length].decode('utf-8')
+
+    def rule(self, rule_id):
+        """Decode a rule record, caching it for later lines"""
+        rule = self.rules.get(rule_id)
+        if rule is None:
+            fields = RULES_STORE_RULE.unpack_from(self.buffer, self.rules_offset + rule_id * RULES_STORE_RULE.size)
+            flags, row = fields[:2]
+            values = [self.read_string(fields[i], fields[i + 1]) for i in range(2, len(fields), 2)]
+            reviews = values[2:2 + len(REVIEW_NUMBERS)]
+            rpms = values[2 + len(REVIEW_NUMBERS):]
+            rule = {
+                'row': row,
+                'species': values[0],
+                'taxon': values[1],
+                'has_guidance': bool(flags & RULES_STORE_HAS_GUIDANCE),
+                'review': dict(zip(REVIEW_NUMBERS, reviews)),
+                'rpms': {n: tuple(rpm.split(';')) if rpm else () for n, rpm in zip(REVIEW_NUMBERS, rpms)}
+            }
+            self.rules[rule_id] = rule
+        return rule
+
+    def get(self, name, default=None):
+        rule_id = self.names.get(name)
+        if rule_id is None:
+            return default
+        return self.rule(rule_id)
+
+    def __getitem__(self, name):
+        return self.rule(self.names[name])
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def items(self):
+        return ((name, self.rule(rule_id)) for name, rule_id in self.names.items())
+
+def set_rules(index):
+    """Install a rules index for processing"""
+    global rules_index, multi_segment_names, multi_segment_prefixes
+    rules_index = index
+    multi_segment_names, multi_segment_prefixes = find_multi_segment_names(
+        list(index) + list(SPECIES_NAME_MAPPINGS))
+    return rules_index
+
+def get_rules_cache_file(rules_path):
+    """Rules store used to cache rules parsed from a rubric workbook"""
+    return os.path.join(RULES_DIR, os.path.splitext(os.path.basename(rules_path))[0] + '.rules')
+
+def rules_source_hash(rules_path):
+    """Hash identifying the rules source; a workbook's hash also covers the sheet read from it"""
+    digest = file_sha256(rules_path)
+    if is_rubric_workbook(rules_path):
+        digest = hashlib.sha256(digest + RUBRIC_SHEET.encode('utf-8')).digest()
+    return digest
+
+def load_rules(rules_csv_path=RULES_FILE, verbose=True, store_path=None):
+    """Load the rules, mapping them from a shared rules store when store_path is given
+
+    rules_csv_path may be the exported rules CSV or the rubric workbook. Workbook rules are
+    always cached in a rules store so the XLSX is only parsed after it changes. The store is
+    rebuilt whenever its source has changed since it was built.
+    """
+    if store_path is None and is_rubric_workbook(rules_csv_path):
+        store_path = get_rules_cache_file(rules_csv_path)
+    if store_path is None:
+        return set_rules(compile_rules_file(rules_csv_path, verbose))
+
+    if os.path.exists(rules_csv_path):
+        source_hash = rules_source_hash(rules_csv_path)
+        header = read_rules_store_header(store_path)
+        if header is None or header['source_hash'] != source_hash:
+            build_rules_store(compile_rules_file(rules_csv_path, verbose), store_path, source_hash)
+    return set_rules(MappedRules(store_path))
+
+def new_processing_stats():
+    """Create empty hit counters for a processing run"""
+    return {
+        'records': 0,
+        'empty_records': 0,
+        'distinct_records': 0,  # Distinct Review Records cells actually processed
+        'species': Counter(),
+        'review_numbers': Counter(),
+        'taxa': Counter(),
+        'unmatched': Counter(),
+        'excluded': Counter(),
+        'default_review': Counter()
+    }
+
+def stats_to_json(stats):
+    """Hit counters as JSON-serializable data, for shard receipts"""
+    return {key: [[name, count] for name, count in value.items()] if isinstance(value, Counter) else value
+            for key, value in stats.items()}
+
+def stats_from_json(data):
+    """Rebuild hit counters saved by stats_to_json; JSON lists become tuple keys again"""
+    stats = new_processing_stats()
+    for key, value in data.items():
+        if isinstance(stats.get(key), Counter):
+            stats[key].update({tuple(name) if isinstance(name, list) else name: count for name, count in value})
+        else:
+            stats[key] = value
+    return stats
+
+def stats_report_rows(stats):
+    """Flatten hit counters into (category, name, detail, count) rows, most frequent first"""
+    rows = [
+        ('summary', 'records', '', stats['records']),
+        ('summary', 'empty_records', '', stats['empty_records']),
+        ('summary', 'distinct_records', '', stats['distinct_records']),
+        ('summary', 'matched_lines', '', sum(stats['species'].values())),
+        ('summary', 'unmatched_lines', '', sum(stats['unmatched'].values())),
+        ('summary', 'excluded_lines', '', sum(stats['excluded'].values())),
+        ('summary', 'default_review_lines', '', sum(stats['default_review'].values()))
+    ]
+    for category in ('species', 'taxa', 'unmatched', 'excluded'):
+        rows.extend((category, name, '', count) for name, count in stats[category].most_common())
+    for (species, review_num), count in stats['review_numbers'].most_common():
+        rows.append(('review_numbers', species, f'Review Language ({review_num})', count))
+    for (species, reason), count in stats['default_review'].most_common():
+        rows.append(('default_review', species, reason, count))
+    return rows
+
+def write_stats_report(stats, output_file, verbose=True):
+    """Write hit counters as JSON and CSV files next to the processed output
+
+    With verbose off the summary is not printed, e.g. in a worker whose parent prints it.
+    """
+    base_name = strip_output_extension(output_file)
+    if base_name.endswith('_processed'):
+        base_name = base_name[:-len('_processed')]
+    json_file = base_name + '_stats.json'
+    csv_file = base_name + '_stats.csv'
+
+    rows = stats_report_rows(stats)
+    report = {}
+    for category, name, detail, count in rows:
+        if category == 'summary':
+            report.setdefault(category, {})[name] = count
+        else:
+            entry = {'name': name, 'count': count}
+            if detail:
+                entry['detail'] = detail
+            report.setdefault(category, []).append(entry)
+
+    with open(json_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    pd.DataFrame(rows, columns=['category', 'name', 'detail', 'count']).to_csv(csv_file, index=False)
+
+    if verbose:
+        print_stats_summary(stats, json_file)
+    return json_file, csv_file
+
+def print_stats_summary(stats, json_file):
+    """Print how many distinct cells were processed and where the statistics were saved"""
+    if stats['distinct_records']:
+        print(f"Processed {stats['distinct_records']:,} distinct Review Records cells for {stats['records']:,} rows "
+              f"({stats['records'] / stats['distinct_records']:.2f} rows per cell)")
+    print(f"Saved statistics to: {os.path.abspath(json_file)}")
+
+def open_review_db(db_path=None):
+    """Open the review database in WAL mode, creating its directory, tables and indexes if needed"""
+    db_path = db_path or review_db_path
+    db_dir = os.path.dirname(os.path.abspath(db_path))
+    # e.g. the default database under processed_data/ before anything else has been written there
+    os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.executescript(REVIEW_DB_SCHEMA)
+    return conn
+
+def review_row_data(row):
+    """Input columns of a processed row as JSON, leaving out the generated review columns"""
+    data = {column: value for column, value in row.items()
+            if column not in (REVIEW_COLUMN, RPM_COLUMN) and not pd.isna(value)}
+    return json.dumps(data, default=str)
+
+def save_reviews(conn, input_file, input_hash, output_df, matches, sheet=''):
+    """Bulk insert processed rows and their matched species, one transaction per batch
+
+    Rows already saved for the same file contents and sheet are replaced, so re-running
+    a file or resuming from a checkpoint never duplicates them.
+    """
+    file_name = os.path.basename(input_file)
+    path = os.path.abspath(input_file)
+    processed_at = datetime.now().isoformat(timespec='seconds')
+    rows = output_df.to_dict('records')
+
+    for batch_start in range(0, len(rows), REVIEW_DB_BATCH_ROWS):
+        batch_stop = min(batch_start + REVIEW_DB_BATCH_ROWS, len(rows))
+        row_numbers = [int(idx) + 1 for idx in output_df.index[batch_start:batch_stop]]
+        species_rows = []
+        rpm_rows = []
+        with conn:
+            conn.execute('DELETE FROM reviews WHERE file = ? AND sheet = ? AND input_hash = ? AND row BETWEEN ? AND ?',
+                         (file_name, sheet, input_hash, row_numbers[0], row_numbers[-1]))
+            for position, row_number in zip(range(batch_start, batch_stop), row_numbers):
+                row = rows[position]
+                cursor = conn.execute(
+                    'INSERT INTO reviews (file, sheet, path, input_hash, row, processed_at, review_records, review, rpms, row_data) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (file_name, sheet, path, input_hash, row_number, processed_at,
+                     row.get('Review Records') if isinstance(row.get('Review Records'), str) else None,
+                     row[REVIEW_COLUMN] or None, row[RPM_COLUMN] or None, review_row_data(row)))
+                review_id = cursor.lastrowid
+                species_rows.extend((review_id, species, taxon, review_num, location)
+                                    for species, taxon, review_num, location in matches[position])
+                rpm_rows.extend((review_id, rpm) for rpm in split_rpm_items(row[RPM_COLUMN]))
+            conn.executemany('INSERT INTO review_species (review_id, species, taxon, review_number, location) '
+                             'VALUES (?, ?, ?, ?, ?)', species_rows)
+            conn.executemany('INSERT INTO review_rpms (review_id, rpm) VALUES (?, ?)', rpm_rows)
+    return len(rows)
+
+def save_review_file(input_file, output_df, matches, sheet=''):
+    """Save a whole processed file or sheet to the review database"""
+    conn = open_review_db()
+    try:
+        return save_reviews(conn, input_file, file_sha256(input_file).hex(), output_df, matches, sheet)
+    finally:
+        conn.close()
+
+def query_reviews(db_path=REVIEW_DB_FILE, species=None, rpm=None, file_name=None, since=None, until=None):
+    """Look up saved rows by matched species, RPM text, input file and processing date"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Review database '{db_path}' not found. Process files with --sqlite first.")
+
+    conditions = []
+    params = []
+    if species:
+        conditions.append('r.id IN (SELECT review_id FROM review_species WHERE species = ? COLLATE NOCASE)')
+        params.append(species)
+    if rpm:
+        conditions.append('r.id IN (SELECT review_id FROM review_rpms WHERE rpm LIKE ?)')
+        params.append(f'%{rpm}%')
+    if file_name:
+        conditions.append('r.file = ?')
+        params.append(os.path.basename(file_name))
+    if since:
+        conditions.append('r.processed_at >= ?')
+        params.append(since)
+    if until:
+        # Dates without a time include the whole day
+        conditions.append('r.processed_at <= ?')
+        params.append(until if 'T' in until else until + 'T23:59:59')
+
+    query = 'SELECT r.file, r.sheet, r.row, r.processed_at, r.row_data FROM reviews r'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY r.processed_at, r.file, r.sheet, r.row'
+
+    conn = sqlite3.connect(db_path)
+    try:
+        records = []
+        for file_name, sheet, row, processed_at, row_data in conn.execute(query, params):
+            record = {'Source File': file_name, 'Sheet': sheet, 'Row': row, 'Processed At': processed_at}
+            record.update((column, value) for column, value in json.loads(row_data).items() if column not in record)
+            records.append(record)
+    finally:
+        conn.close()
+    return pd.DataFrame(records, columns=None if records else ['Source File', 'Sheet', 'Row', 'Processed At'])
+
+def summarize_distances(row_matches):
+    """Nearest record distance in feet and the distances of each matched line, e.g. 'Pacific fisher: >650'"""
+    nearest = None
+    details = []
+    for species, _, _, location in row_matches:
+        distances = parse_location_distances(location) if location else ()
+        if not distances:
+            continue
+        texts = []
+        for distance in distances:
+            if distance.within is False:
+                texts.append(f">{distance.feet:g}")
+            else:
+                texts.append(f"{distance.feet:g}")
+                nearest = distance.feet if nearest is None else min(nearest, distance.feet)
+        details.append(f"{species}: {', '.join(texts)}")
+    return nearest, '; '.join(details)
+
+def process_record_rows(input_df, start=0, stop=None, matches=None):
+    """Process input rows [start, stop) and return them with the generated review columns
+
+    Identical Review Records cells are processed once and their results copied to every row
+    holding them; hit counters still count every row. If matches is a list, one list of
+    (species, taxon, review number, location) is appended per row.
+    """
+    global processing_stats
+    output_df = input_df.iloc[start:stop].copy()
+
+    # Codes follow first appearance, so distinct cells are processed in row order
+    cells = output_df['Review Records']
+    codes, distinct_cells = pd.factorize(cells, use_na_sentinel=False)
+    row_codes = codes.tolist()
+    counts = Counter(row_codes)
+    first_rows = output_df.index[~cells.duplicated()]
+
+    collect_matches = matches is not None or add_distance_columns
+    distinct_matches = []
+    distinct_reviews = []
+    distinct_rpms = []
+    distinct_provenance = []
+    total_stats = processing_stats
+    try:
+        for code, (idx, review_records) in enumerate(zip(first_rows, distinct_cells)):
+            if show_record_progress:
+                print(f"Processing record {idx + 1}...")
+            count = counts[code]
+            if pd.isna(review_records) or not review_records:
+                total_stats['empty_records'] += count
+            # Collect a repeated cell's hits separately so they can be counted once per row
+            if count > 1:
+                processing_stats = new_processing_stats()
+            row_matches = [] if collect_matches else None
+            row_provenance = [] if add_provenance_column else None
+            review, rpms = process_single_record(review_records, row_matches, row_provenance)
+            if count > 1:
+                merge_processing_stats(total_stats, processing_stats, times=count)
+                processing_stats = total_stats
+            distinct_matches.append(row_matches)
+            distinct_provenance.append(''.join(row_provenance) if add_provenance_column else None)
+            distinct_reviews.append(review if review else '')
+            distinct_rpms.append(rpms if rpms else '')
+    finally:
+        processing_stats = total_stats
+    processing_stats['records'] += len(row_codes)
+    processing_stats['distinct_records'] += len(distinct_cells)
+
+    output_df[REVIEW_COLUMN] = [distinct_reviews[code] for code in row_codes]
+    output_df[RPM_COLUMN] = [distinct_rpms[code] for code in row_codes]
+    if add_distance_columns:
+        distances = [summarize_distances(distinct_matches[code]) for code in range(len(distinct_cells))]
+        output_df[NEAREST_DISTANCE_COLUMN] = pd.Series([distances[code][0] for code in row_codes], index=output_df.index, dtype=float)
+        output_df[DISTANCES_COLUMN] = [distances[code][1] for code in row_codes]
+    if add_provenance_column:
+        output_df[PROVENANCE_COLUMN] = [distinct_provenance[code] for code in row_codes]
+    if matches is not None:
+        # Rows sharing a cell share its match list; the database writer only reads them
+        matches.extend(distinct_matches[code] for code in row_codes)
+    return output_df
+
+def process_species_records(input_csv_path, rules_csv_path=RULES_FILE, rules_store=None):
     """Process species records from input CSV using classification rules"""
     print(f"\nReading input file: {input_csv_path}")
     print(f"Reading rules file: {rules_csv_path}")
     
-    dtypes = {
-        'Review Records': str,
-        'Biological Resource Review (presence/absence, resource description if appropriate)': str,
-        'Biological RPMs': str
-    }
+    global processing_stats
+    input_df = pd.read_csv(input_csv_path, dtype=INPUT_DTYPES)
+    load_rules(rules_csv_path, store_path=rules_store)
+    processing_stats = new_processing_stats()
     
-    global rules_df
-    input_df = pd.read_csv(input_csv_path, dtype=dtypes)
-    rules_df = pd.read_csv(rules_csv_path, dtype=str)
-    
-    results = []
-    for idx, row in input_df.iterrows():
-        print(f"Processing record {idx + 1}...")
-        review, rpms = process_single_record(row['Review Records'])
-        results.append({
-            'Biological Resource Review (presence/absence, resource description if appropriate)': review if review else '',
-            'Biological RPMs': rpms if rpms else ''
+    return process_record_rows(input_df)
+
+def get_checkpoint_dir(output_file):
+    """Directory holding the checkpoint for an output file"""
+    return os.path.join(os.path.dirname(os.path.abspath(output_file)), '.' + os.path.basename(output_file) + '.checkpoint')
+
+def write_file_atomically(path, data):
+    """Write bytes to a file through a synced temporary file so readers never see a partial file"""
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+
+def save_checkpoint(checkpoint_dir, state, stats):
+    """Record the completed rows and the hit counters so far"""
+    write_file_atomically(os.path.join(checkpoint_dir, 'stats.pkl'), pickle.dumps(stats))
+    write_file_atomically(os.path.join(checkpoint_dir, 'checkpoint.json'), json.dumps(state, indent=2).encode('utf-8'))
+
+def load_checkpoint(checkpoint_dir, fingerprint):
+    """Load a checkpoint if it was made for the same input and rules, else return None"""
+    try:
+        with open(os.path.join(checkpoint_dir, 'checkpoint.json')) as f:
+            state = json.load(f)
+        with open(os.path.join(checkpoint_dir, 'stats.pkl'), 'rb') as f:
+            stats = pickle.load(f)
+    except (FileNotFoundError, ValueError, pickle.UnpicklingError):
+        return None, None
+
+    for key, value in fingerprint.items():
+        if state.get(key) != value:
+            print(f"Checkpoint {key} does not match this run, starting over")
+            return None, None
+    if not all(os.path.exists(os.path.join(checkpoint_dir, chunk)) for chunk in state['chunks']):
+        print("Checkpoint is missing output chunks, starting over")
+        return None, None
+    return state, stats
+
+def process_with_checkpoints(input_csv_path, output_file, output_format='csv', rules_csv_path=RULES_FILE,
+                             rules_store=None, resume=False, checkpoint_rows=CHECKPOINT_ROWS,
+                             input_dtypes=INPUT_DTYPES, row_offset=0, review_source=None):
+    """Process an input file in chunks, checkpointing after each chunk so the run can be resumed
+
+    row_offset numbers the records from a later row, e.g. for a shard of a larger input.
+    review_source is the (file, sha256 hex) the rows are saved under in the review database,
+    by default the input file itself.
+    """
+    global processing_stats
+    start_time = time.perf_counter()
+    print(f"\nReading input file: {input_csv_path}")
+    print(f"Reading rules file: {rules_csv_path}")
+
+    input_df = pd.read_csv(input_csv_path, dtype=input_dtypes)
+    input_df.index += row_offset
+    load_rules(rules_csv_path, store_path=rules_store)
+
+    checkpoint_dir = get_checkpoint_dir(output_file)
+    fingerprint = {
+        'input_hash': file_sha256(input_csv_path).hex(),
+        'rules_hash': file_sha256(rules_csv_path).hex() if os.path.exists(rules_csv_path) else None,
+        'rows': len(input_df),
+        # Checkpointed chunks already hold the optional columns, so toggling them must start over
+        'distance_columns': add_distance_columns,
+        'provenance_column': add_provenance_column,
+        # Rows of checkpointed chunks are only in the review database the run was saving to
+        'review_db': os.path.abspath(review_db_path) if review_db_path else None
+    }
+
+    state, stats = load_checkpoint(checkpoint_dir, fingerprint) if resume else (None, None)
+    if state is None:
+        if os.path.exists(checkpoint_dir):
+            shutil.rmtree(checkpoint_dir)
+        os.makedirs(checkpoint_dir)
+        state = dict(fingerprint, next_row=0, chunks=[])
+        processing_stats = new_processing_stats()
+    else:
+        processing_stats = stats
+        print(f"Resuming from record {state['next_row'] + 1} of {len(input_df)}")
+
+    review_db = open_review_db() if review_db_path else None
+    review_file, review_hash = review_source or (input_csv_path, fingerprint['input_hash'])
+    checkpoint_seconds = 0.0
+    while state['next_row'] < len(input_df):
+        stop = min(state['next_row'] + checkpoint_rows, len(input_df))
+        matches = [] if review_db is not None else None
+        chunk = process_record_rows(input_df, state['next_row'], stop, matches)
+        if review_db is not None:
+            # Saved before the checkpoint; a resumed chunk replaces its rows rather than duplicating them
+            save_reviews(review_db, review_file, review_hash, chunk, matches)
+
+        checkpoint_start = time.perf_counter()
+        chunk_file = f"chunk-{len(state['chunks']):06d}.pkl"
+        write_file_atomically(os.path.join(checkpoint_dir, chunk_file), pickle.dumps(chunk))
+        state['chunks'].append(chunk_file)
+        state['next_row'] = stop
+        save_checkpoint(checkpoint_dir, state, processing_stats)
+        checkpoint_seconds += time.perf_counter() - checkpoint_start
+
+    print(f"Saving results to: {os.path.abspath(output_file)}")
+    if state['chunks']:
+        chunks = (pd.read_pickle(os.path.join(checkpoint_dir, chunk)) for chunk in state['chunks'])
+    else:
+        chunks = [process_record_rows(input_df, 0, 0)]
+    write_output_chunks(chunks, output_file, output_format)
+    shutil.rmtree(checkpoint_dir)
+    if review_db is not None:
+        review_db.close()
+        print(f"Saved {len(input_df)} rows to review database: {os.path.abspath(review_db_path)}")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Checkpoint overhead: {checkpoint_seconds:.2f}s ({100 * checkpoint_seconds / elapsed:.1f}% of {elapsed:.2f}s)")
+    return processing_stats
+
+def split_review_paragraphs(review):
+    """Split generated review text into its species paragraphs"""
+    review = review.replace('\r\n', '\n').strip()
+    if review.startswith('POTENTIAL TO OCCUR:'):
+        review = review[len('POTENTIAL TO OCCUR:'):]
+    return [paragraph.strip() for paragraph in review.split('\n\n') if paragraph.strip()]
+
+def split_rpm_items(rpms):
+    """Split generated RPM text into its individual measures"""
+    return [item.strip() for item in rpms.replace('\r\n', '\n').split(';') if item.strip()]
+
+def paragraph_label(paragraph):
+    """Short label for a review paragraph: the species name before its status details"""
+    return paragraph.split(' (', 1)[0].split('\n', 1)[0][:60]
+
+def diff_review_text(expected, existing):
+    """Compact diff of review paragraphs: + missing, - unexpected, ~ changed text"""
+    expected_paragraphs = {paragraph_label(p): p for p in split_review_paragraphs(expected)}
+    existing_paragraphs = {paragraph_label(p): p for p in split_review_paragraphs(existing)}
+
+    changes = [f"+ {label}" for label in expected_paragraphs if label not in existing_paragraphs]
+    changes += [f"- {label}" for label in existing_paragraphs if label not in expected_paragraphs]
+    changes += [f"~ {label}" for label, paragraph in expected_paragraphs.items()
+                if label in existing_paragraphs and existing_paragraphs[label] != paragraph]
+    if not changes and list(expected_paragraphs) != list(existing_paragraphs):
+        changes.append('order differs')
+    return '\n'.join(changes)
+
+def diff_rpm_text(expected, existing):
+    """Compact diff of RPM measures: + missing, - unexpected"""
+    expected_items = split_rpm_items(expected)
+    existing_items = split_rpm_items(existing)
+    existing_set = set(existing_items)
+    expected_set = set(expected_items)
+
+    changes = [f"+ {item}" for item in expected_items if item not in existing_set]
+    changes += [f"- {item}" for item in existing_items if item not in expected_set]
+    if not changes and expected_items != existing_items:
+        changes.append('order differs')
+    return '\n'.join(changes)
+
+def normalize_audit_value(value):
+    """Normalize an existing or generated cell for comparison"""
+    if not isinstance(value, str):
+        return ''
+    return value.replace('\r\n', '\n').strip()
+
+def audit_chunks(input_chunks, summary):
+    """Compare mapper output with the existing review columns, yielding only rows that differ"""
+    row_number = 0
+    for chunk in input_chunks:
+        for column in (REVIEW_COLUMN, RPM_COLUMN):
+            if column not in chunk.columns:
+                chunk[column] = ''
+
+        # Identical Review Records cells are mapped once per chunk, as in process_record_rows
+        codes, distinct_cells = pd.factorize(chunk['Review Records'], use_na_sentinel=False)
+        distinct_outputs = []
+        for review_records in distinct_cells:
+            review, rpms = process_single_record(review_records)
+            distinct_outputs.append((normalize_audit_value(review), normalize_audit_value(rpms)))
+
+        differing = []
+        review_diffs = []
+        rpm_diffs = []
+        for position, (code, existing_review, existing_rpms) in enumerate(
+                zip(codes.tolist(), chunk[REVIEW_COLUMN], chunk[RPM_COLUMN])):
+            review, rpms = distinct_outputs[code]
+            existing_review = normalize_audit_value(existing_review)
+            existing_rpms = normalize_audit_value(existing_rpms)
+
+            if review == existing_review and rpms == existing_rpms:
+                continue
+            differing.append(position)
+            review_diffs.append(diff_review_text(review, existing_review) if review != existing_review else '')
+            rpm_diffs.append(diff_rpm_text(rpms, existing_rpms) if rpms != existing_rpms else '')
+            summary['review_differences'] += review != existing_review
+            summary['rpm_differences'] += rpms != existing_rpms
+
+        summary['rows'] += len(chunk)
+        summary['differing_rows'] += len(differing)
+        diff_df = chunk.iloc[differing].drop(columns=[REVIEW_COLUMN, RPM_COLUMN])
+        diff_df.insert(0, AUDIT_ROW_COLUMN, [row_number + position + 1 for position in differing])
+        diff_df['Review Diff'] = review_diffs
+        diff_df['RPM Diff'] = rpm_diffs
+        row_number += len(chunk)
+        yield diff_df
+
+def audit_species_records(input_csv_path, audit_file, output_format='csv', rules_csv_path=RULES_FILE, rules_store=None):
+    """Write only the input rows whose existing review columns differ from the mapper output"""
+    global processing_stats
+    start_time = time.perf_counter()
+    print(f"\nAuditing input file: {input_csv_path}")
+    load_rules(rules_csv_path, store_path=rules_store)
+    processing_stats = None
+
+    summary = Counter()
+    input_chunks = pd.read_csv(input_csv_path, dtype=INPUT_DTYPES, chunksize=OUTPUT_CHUNK_ROWS)
+    write_output_chunks(audit_chunks(input_chunks, summary), audit_file, output_format)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Audited {summary['rows']} rows in {elapsed:.2f}s: {summary['differing_rows']} differ "
+          f"({summary['review_differences']} review, {summary['rpm_differences']} RPM)")
+    print(f"Saved audit to: {os.path.abspath(audit_file)}")
+    return summary
+
+def merge_processing_stats(total, stats, times=1):
+    """Add one run's hit counters into a running total, counted times over"""
+    for key, value in stats.items():
+        if isinstance(value, Counter):
+            if times == 1:
+                total[key].update(value)
+            else:
+                for name, count in value.items():
+                    total[key][name] += count * times
+        else:
+            total[key] += value * times
+    return total
+
+def find_record_sheets(xlsx_file):
+    """List the sheets in a workbook that have a Review Records column"""
+    with pd.ExcelFile(xlsx_file) as xls:
+        return [sheet for sheet in xls.sheet_names
+                if 'Review Records' in pd.read_excel(xls, sheet_name=sheet, nrows=0).columns]
+
+def get_sheet_output_file(xlsx_file, sheet_name, output_format='csv'):
+    """Build the processed output path for one sheet of a workbook"""
+    sheet_label = re.sub(r'[^\w.-]+', '_', sheet_name).strip('_')
+    return get_output_file(xlsx_file.rsplit('.', 1)[0] + '_' + sheet_label + '.xlsx', output_format)
+
+def init_worker(rules_csv_path=RULES_FILE, rules_store=None, db_path=None, distance_columns=False,
+                provenance_column=False):
+    """Load the rules once in each worker process"""
+    global show_record_progress, review_db_path, add_distance_columns, add_provenance_column
+    show_record_progress = False
+    review_db_path = db_path
+    add_distance_columns = distance_columns
+    add_provenance_column = provenance_column
+    load_rules(rules_csv_path, verbose=False, store_path=rules_store)
+
+def process_sheet(xlsx_file, sheet_name, output_file=None, output_format='csv'):
+    """Process one workbook sheet, writing it to output_file or returning the processed rows"""
+    global processing_stats
+    processing_stats = new_processing_stats()
+    input_df = pd.read_excel(xlsx_file, sheet_name=sheet_name, dtype=INPUT_DTYPES)
+    matches = [] if review_db_path else None
+    output_df = process_record_rows(input_df, matches=matches)
+    if review_db_path:
+        save_review_file(xlsx_file, output_df, matches, sheet_name)
+
+    json_file = None
+    if output_file:
+        write_output(output_df, output_file, output_format)
+        # Printed by the parent, so the summaries of sheets finishing together do not interleave
+        json_file, _ = write_stats_report(processing_stats, output_file, verbose=False)
+        output_df = None
+    return sheet_name, output_df, processing_stats, json_file
+
+def process_workbook(xlsx_file, sheets, output_format='csv', rules_csv_path=RULES_FILE, rules_store=None,
+                     workers=None, combined=False):
+    """Process workbook sheets in parallel, one output per sheet or one combined workbook"""
+    workers = min(workers or os.cpu_count() or 1, len(sheets))
+    print(f"\nProcessing {len(sheets)} sheets from {xlsx_file} with {workers} workers")
+
+    # Load (and validate) the rules once here so problems are reported before starting workers
+    load_rules(rules_csv_path, store_path=rules_store)
+
+    total_stats = new_processing_stats()
+    processed_sheets = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(rules_csv_path, rules_store, review_db_path, add_distance_columns,
+                                       add_provenance_column)) as executor:
+        futures = []
+        for sheet_name in sheets:
+            output_file = None if combined else get_sheet_output_file(xlsx_file, sheet_name, output_format)
+            futures.append(executor.submit(process_sheet, xlsx_file, sheet_name, output_file, output_format))
+
+        for future in as_completed(futures):
+            sheet_name, output_df, stats, json_file = future.result()
+            print(f"Finished sheet '{sheet_name}': {stats['records']} records")
+            if json_file:
+                print_stats_summary(stats, json_file)
+            merge_processing_stats(total_stats, stats)
+            if output_df is not None:
+                processed_sheets[sheet_name] = output_df
+
+    if combined:
+        output_file = get_output_file(xlsx_file).rsplit('.', 1)[0] + '.xlsx'
+        write_workbook(processed_sheets, sheets, output_file)
+        write_stats_report(total_stats, output_file)
+    return total_stats
+
+def write_workbook(processed_sheets, sheets, output_file):
+    """Write processed sheets to one workbook, in their original order, replacing it atomically"""
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    fd, temp_file = tempfile.mkstemp(dir=output_dir, prefix='.' + os.path.basename(output_file) + '.', suffix='.tmp.xlsx')
+    os.close(fd)
+    try:
+        with pd.ExcelWriter(temp_file) as writer:
+            for sheet_name in sheets:
+                processed_sheets[sheet_name].to_excel(writer, sheet_name=sheet_name, index=False)
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    print(f"Saved {len(sheets)} sheets to: {os.path.abspath(output_file)}")
+
+def get_shard_dir(input_file):
+    """Directory holding the shards and manifest for an input file"""
+    return os.path.join(OUTPUT_DIR, os.path.basename(input_file).rsplit('.', 1)[0] + '_shards')
+
+def get_shard_receipt_file(shard_file):
+    """Receipt written next to a shard once it has been processed"""
+    return shard_file.rsplit('.', 1)[0] + '_receipt.json'
+
+def iter_csv_records(input_csv_path):
+    """Yield the header and then each record of a CSV file, keeping quoted multi-line cells whole"""
+    with open(input_csv_path, newline='', encoding='utf-8') as f:
+        for record in csv.reader(f):
+            # pandas skips blank lines, so they are not records
+            if record:
+                yield record
+
+def split_into_shards(input_csv_path, shard_count, rules_csv_path=RULES_FILE):
+    """Split an input CSV into shards of consecutive records and write a manifest describing them"""
+    print(f"\nSplitting {input_csv_path} into {shard_count} shards")
+    rows = sum(1 for _ in iter_csv_records(input_csv_path)) - 1
+    if rows < 0:
+        raise ValueError(f"Input file '{input_csv_path}' is empty")
+    shard_count = max(1, min(shard_count, rows))
+    bounds = [rows * shard // shard_count for shard in range(shard_count + 1)]
+
+    shard_dir = get_shard_dir(input_csv_path)
+    os.makedirs(shard_dir, exist_ok=True)
+    records = iter_csv_records(input_csv_path)
+    header = next(records)
+    shards = []
+    for index in range(shard_count):
+        shard_file = f"shard-{index:04d}-of-{shard_count:04d}.csv"
+        shard_path = os.path.join(shard_dir, shard_file)
+        with open(shard_path + '.tmp', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for _ in range(bounds[index], bounds[index + 1]):
+                writer.writerow(next(records))
+        os.replace(shard_path + '.tmp', shard_path)
+        shards.append({
+            'index': index,
+            'file': shard_file,
+            'start': bounds[index],
+            'stop': bounds[index + 1],
+            'sha256': file_sha256(shard_path).hex()
         })
-    
-    results_df = pd.DataFrame(results)
-    output_df = input_df.copy()
-    output_df['Biological Resource Review (presence/absence, resource description if appropriate)'] = results_df['Biological Resource Review (presence/absence, resource description if appropriate)']
-    output_df['Biological RPMs'] = results_df['Biological RPMs']
-    
-    return output_df
+
+    manifest = {
+        'version': SHARD_MANIFEST_VERSION,
+        'input_file': os.path.basename(input_csv_path),
+        'input_path': os.path.abspath(input_csv_path),
+        'input_hash': file_sha256(input_csv_path).hex(),
+        'rules_file': os.path.basename(rules_csv_path),
+        'rules_hash': rules_source_hash(rules_csv_path).hex(),
+        'rows': rows,
+        'shards': shards
+    }
+    manifest_file = os.path.join(shard_dir, SHARD_MANIFEST_FILE)
+    write_file_atomically(manifest_file, json.dumps(manifest, indent=2).encode('utf-8'))
+    print(f"Wrote {shard_count} shards of about {rows // shard_count} records and their manifest to: {os.path.abspath(shard_dir)}")
+    return manifest_file
+
+def load_shard_manifest(path):
+    """Load a shard manifest, given the manifest file or its shard directory"""
+    manifest_file = os.path.join(path, SHARD_MANIFEST_FILE) if os.path.isdir(path) else path
+    if not os.path.exists(manifest_file):
+        raise FileNotFoundError(f"Shard manifest '{manifest_file}' not found")
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != SHARD_MANIFEST_VERSION:
+        raise ValueError(f"Shard manifest '{manifest_file}' has unsupported version {manifest.get('version')}")
+    return manifest, os.path.dirname(os.path.abspath(manifest_file))
+
+def process_shard(shard_file, output_format='csv', rules_csv_path=RULES_FILE, rules_store=None, resume=False,
+                  checkpoint_rows=CHECKPOINT_ROWS):
+    """Process one shard after checking it and the rules against the manifest, then write its receipt"""
+    manifest, shard_dir = load_shard_manifest(os.path.dirname(os.path.abspath(shard_file)))
+    entry = next((shard for shard in manifest['shards'] if shard['file'] == os.path.basename(shard_file)), None)
+    if entry is None:
+        raise ValueError(f"'{shard_file}' is not listed in the shard manifest")
+    if file_sha256(shard_file).hex() != entry['sha256']:
+        raise ValueError(f"'{shard_file}' has changed since the input was split")
+    rules_hash = rules_source_hash(rules_csv_path).hex()
+    if rules_hash != manifest['rules_hash']:
+        raise ValueError(f"Rules '{rules_csv_path}' differ from the rules '{manifest['rules_file']}' the input was split with")
+
+    print(f"\nProcessing shard {entry['index'] + 1} of {len(manifest['shards'])} (records {entry['start'] + 1}-{entry['stop']})")
+    output_file = os.path.join(shard_dir, entry['file'].rsplit('.', 1)[0] + '_processed' + OUTPUT_FORMATS[output_format])
+    # Shards are read as text so every shard has the same column types and values come back unchanged
+    stats = process_with_checkpoints(shard_file, output_file, output_format, rules_csv_path, rules_store,
+                                     resume=resume, checkpoint_rows=checkpoint_rows, input_dtypes=str,
+                                     row_offset=entry['start'],
+                                     # Saved under the original input, so its rows can be queried and replaced
+                                     review_source=(manifest.get('input_path', manifest['input_file']),
+                                                    manifest['input_hash']))
+
+    receipt = dict(entry, input_hash=manifest['input_hash'], rules_hash=rules_hash,
+                   output_file=os.path.basename(output_file), output_format=output_format,
+                   stats=stats_to_json(stats))
+    write_file_atomically(get_shard_receipt_file(os.path.join(shard_dir, entry['file'])),
+                          json.dumps(receipt, indent=2).encode('utf-8'))
+    return output_file
+
+def read_output_chunks(path, output_format):
+    """Read a processed output file back in row chunks, with every column as text"""
+    if output_format in ('parquet', 'arrow'):
+        try:
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(f"The {output_format} output format requires the pyarrow package (pip install pyarrow)")
+        if output_format == 'parquet':
+            batches = pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=OUTPUT_CHUNK_ROWS)
+            for batch in batches:
+                yield batch.to_pandas()
+        else:
+            with pyarrow.ipc.open_file(path) as reader:
+                for index in range(reader.num_record_batches):
+                    yield reader.get_batch(index).to_pandas()
+        return
+
+    if output_format == 'csv.zst':
+        try:
+            import zstandard  # noqa: F401  (used by pandas to decompress)
+        except ImportError:
+            raise ImportError("The csv.zst output format requires the zstandard package (pip install zstandard)")
+    compression = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}[output_format]
+    yield from pd.read_csv(path, dtype=str, keep_default_na=False, compression=compression, chunksize=OUTPUT_CHUNK_ROWS)
+
+def merge_shards(manifest_path):
+    """Check every shard's receipt against the manifest and concatenate the outputs in row order"""
+    manifest, shard_dir = load_shard_manifest(manifest_path)
+    print(f"\nMerging {len(manifest['shards'])} shards of {manifest['input_file']}")
+
+    receipts = []
+    problems = []
+    for entry in manifest['shards']:
+        receipt_file = get_shard_receipt_file(os.path.join(shard_dir, entry['file']))
+        if not os.path.exists(receipt_file):
+            problems.append(f"{entry['file']} has not been processed (no {os.path.basename(receipt_file)})")
+            continue
+        with open(receipt_file) as f:
+            receipt = json.load(f)
+
+        if receipt.get('sha256') != entry['sha256'] or receipt.get('input_hash') != manifest['input_hash']:
+            problems.append(f"{entry['file']} was processed from a different split of the input")
+        elif receipt.get('rules_hash') != manifest['rules_hash']:
+            problems.append(f"{entry['file']} was processed with different rules")
+        elif (receipt.get('start'), receipt.get('stop')) != (entry['start'], entry['stop']):
+            problems.append(f"{entry['file']} covers records {receipt.get('start')}-{receipt.get('stop')}, "
+                            f"expected {entry['start']}-{entry['stop']}")
+        elif not os.path.exists(os.path.join(shard_dir, receipt['output_file'])):
+            problems.append(f"{entry['file']} output {receipt['output_file']} is missing")
+        receipts.append(receipt)
+
+    output_formats = {receipt['output_format'] for receipt in receipts}
+    if len(output_formats) > 1:
+        problems.append(f"Shards were written in different output formats: {', '.join(sorted(output_formats))}")
+    if problems:
+        raise ValueError("Cannot merge shards:\n" + '\n'.join(f"  {problem}" for problem in problems))
+
+    output_format = output_formats.pop()
+    output_file = get_output_file(manifest['input_file'], output_format)
+
+    def merged_chunks():
+        for receipt in receipts:
+            rows = 0
+            for chunk in read_output_chunks(os.path.join(shard_dir, receipt['output_file']), output_format):
+                rows += len(chunk)
+                yield chunk
+            if rows != receipt['stop'] - receipt['start']:
+                raise ValueError(f"{receipt['output_file']} has {rows} rows, expected {receipt['stop'] - receipt['start']}")
+
+    print(f"Saving results to: {os.path.abspath(output_file)}")
+    write_output_chunks(merged_chunks(), output_file, output_format)
+
+    total_stats = new_processing_stats()
+    for receipt in receipts:
+        merge_processing_stats(total_stats, stats_from_json(receipt['stats']))
+    write_stats_report(total_stats, output_file)
+    return output_file, total_stats
+
+def process_input_file(input_file, output_format='csv'):
+    """Process one CSV or XLSX file with the rules already loaded and write its outputs"""
+    global processing_stats
+    if input_file.lower().endswith('.xlsx'):
+        sheets = find_record_sheets(input_file)
+        if not sheets:
+            print(f"No sheet in {input_file} has a 'Review Records' column")
+            return []
+        if len(sheets) == 1:
+            targets = [(sheets[0], get_output_file(input_file, output_format))]
+        else:
+            targets = [(sheet, get_sheet_output_file(input_file, sheet, output_format)) for sheet in sheets]
+        for sheet, output_file in targets:
+            _, _, stats, json_file = process_sheet(input_file, sheet, output_file, output_format)
+            print_stats_summary(stats, json_file)
+        return [output_file for _, output_file in targets]
+
+    processing_stats = new_processing_stats()
+    matches = [] if review_db_path else None
+    output_df = process_record_rows(pd.read_csv(input_file, dtype=INPUT_DTYPES), matches=matches)
+    if review_db_path:
+        save_review_file(input_file, output_df, matches)
+    output_file = get_output_file(input_file, output_format)
+    write_output(output_df, output_file, output_format)
+    write_stats_report(processing_stats, output_file)
+    return [output_file]
+
+def is_watch_candidate(file_name):
+    """Check whether a file in the watched folder is an input to process"""
+    return (file_name.lower().endswith(('.csv', '.xlsx'))
+            and not file_name.startswith(('.', '~$'))
+            and file_name not in (os.path.basename(RULES_FILE), RUBRIC_FILE))
+
+def file_signature(path):
+    """Size and modification time of a file, or None if it no longer exists"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def scan_watch_folder(folder):
+    """Signatures of the input files currently in the watched folder"""
+    signatures = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and is_watch_candidate(entry.name):
+                signatures[entry.path] = file_signature(entry.path)
+    return signatures
+
+def start_change_observer(folder, changed_paths, lock):
+    """Collect filesystem notifications for the folder with watchdog, or return None to poll instead"""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class ChangeHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            # Ignore open/read events, including the workers' own reads of the file
+            if event.event_type not in ('created', 'modified', 'moved', 'closed'):
+                return
+            path = getattr(event, 'dest_path', '') or event.src_path
+            if not event.is_directory and is_watch_candidate(os.path.basename(path)):
+                with lock:
+                    changed_paths.add(os.path.join(folder, os.path.basename(path)))
+
+    observer = Observer()
+    observer.schedule(ChangeHandler(), folder, recursive=False)
+    observer.start()
+    return observer
+
+def watch_folder(folder='.', output_format='csv', rules_csv_path=RULES_FILE, rules_store=None, workers=None,
+                 poll_seconds=WATCH_POLL_SECONDS, settle_seconds=WATCH_SETTLE_SECONDS):
+    """Process new or modified CSV/XLSX files dropped into a folder until interrupted"""
+    folder = os.path.abspath(folder)
+    if folder == os.path.abspath(OUTPUT_DIR):
+        raise ValueError(f"Cannot watch the output directory {OUTPUT_DIR}")
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    # Load (and validate) the rules once here so problems are reported before starting workers
+    load_rules(rules_csv_path, store_path=rules_store)
+    ensure_output_directory()
+
+    lock = threading.Lock()
+    changed_paths = set()
+    observer = start_change_observer(folder, changed_paths, lock)
+    print(f"\nWatching {folder} for CSV/XLSX files ({'filesystem notifications' if observer else 'polling'}, {workers} workers)")
+    print("Press Ctrl+C to stop")
+
+    # Files already in the folder are not processed until they change
+    known = scan_watch_folder(folder)
+    pending = {}
+    in_flight = {}
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                   initargs=(rules_csv_path, rules_store, review_db_path, add_distance_columns,
+                                             add_provenance_column))
+    try:
+        while True:
+            if observer is not None:
+                with lock:
+                    changed = set(changed_paths)
+                    changed_paths.clear()
+            else:
+                changed = {path for path, signature in scan_watch_folder(folder).items()
+                           if known.get(path) != signature and path not in pending}
+
+            now = time.monotonic()
+            for path in changed:
+                signature = file_signature(path)
+                if signature is not None and signature != known.get(path):
+                    pending[path] = (signature, now)
+
+            # Debounce: only submit files whose size and mtime have stopped changing
+            for path, (signature, since) in list(pending.items()):
+                current = file_signature(path)
+                if current is None:
+                    del pending[path]
+                elif current != signature:
+                    pending[path] = (current, now)
+                elif now - since >= settle_seconds and path not in in_flight and len(in_flight) < max_in_flight:
+                    print(f"Queued {os.path.basename(path)}")
+                    in_flight[path] = executor.submit(process_input_file, path, output_format)
+                    known[path] = current
+                    del pending[path]
+
+            for path, future in list(in_flight.items()):
+                if future.done():
+                    del in_flight[path]
+                    try:
+                        outputs = future.result()
+                        print(f"Processed {os.path.basename(path)} -> {', '.join(os.path.basename(o) for o in outputs)}")
+                    except Exception as e:
+                        print(f"Error processing {os.path.basename(path)}: {e}")
+
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("\nStopping watch mode")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        executor.shutdown(wait=True)
+
+def validate_rules_file(rules_csv_path=RULES_FILE):
+    """Run the rules validator on its own and print a summary"""
+    print(f"\nValidating rules file: {rules_csv_path}")
+    rules_df = read_rules_table(rules_csv_path)
+    errors, warnings = validate_rules(rules_df)
+
+    for error in errors:
+        print(f"Error: {error}")
+    for warning in warnings:
+        print(f"Warning: {warning}")
+
+    print(f"{len(rules_df)} rules checked: {len(errors)} errors, {len(warnings)} warnings")
+    return 1 if errors else 0
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Map species review records to review language and RPMs')
+    parser.add_argument('--rules', default=RULES_FILE, metavar='RULES',
+                        help=f"Rules CSV, or the rubric workbook to read sheet '{RUBRIC_SHEET}' from directly (default: {RULES_FILE})")
+    parser.add_argument('--validate-rules', action='store_true',
+                        help='Check the rules file for problems and exit')
+    parser.add_argument('--rules-store', nargs='?', const=RULES_STORE_FILE, metavar='STORE',
+                        help='Map the rules from a shared memory-mapped store, rebuilding it when the rules CSV changes')
+    parser.add_argument('--watch', nargs='?', const='.', metavar='FOLDER',
+                        help='Process new or modified CSV/XLSX files dropped into FOLDER (default: current directory) until stopped')
+    parser.add_argument('--audit', action='store_true',
+                        help='Compare mapper output with the existing review columns and write only the rows that differ')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run from its last checkpoint')
+    parser.add_argument('--checkpoint-rows', type=int, default=CHECKPOINT_ROWS,
+                        help=f'Records processed between checkpoints (default: {CHECKPOINT_ROWS})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for multi-sheet workbooks (default: one per CPU)')
+    parser.add_argument('--combined-workbook', action='store_true',
+                        help='Write all processed sheets of a workbook to one _processed.xlsx instead of one file per sheet')
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv',
+                        help='Format for the processed output file (default: csv)')
+    parser.add_argument('--split-shards', type=int, metavar='N',
+                        help='Split the selected input into N shards with a manifest, to be processed separately and merged')
+    parser.add_argument('--process-shard', metavar='SHARD',
+                        help='Process one shard CSV written by --split-shards, next to its manifest')
+    parser.add_argument('--merge-shards', metavar='SHARD_DIR',
+                        help='Check the processed shards in SHARD_DIR against its manifest and merge them in original row order')
+    parser.add_argument('--distance-columns', action='store_true',
+                        help='Add the record distances parsed from each row\'s locations as output columns')
+    parser.add_argument('--provenance', action='store_true',
+                        help='Add a column recording the rules row, review number and modifiers behind each paragraph and RPM')
+    parser.add_argument('--sqlite', nargs='?', const=REVIEW_DB_FILE, metavar='DB',
+                        help=f'Also save processed rows and their matched species to a SQLite database (default: {REVIEW_DB_FILE})')
+
+    query = parser.add_argument_group('querying the SQLite database', 'Print saved rows matching all given filters as CSV and exit')
+    query.add_argument('--query', action='store_true', help='Query the --sqlite database instead of processing a file')
+    query.add_argument('--species', help="Rows that matched this species, e.g. 'Pacific fisher'")
+    query.add_argument('--rpm', help="Rows whose RPMs contain this text, e.g. 'CBI'")
+    query.add_argument('--file', help='Rows from this input file')
+    query.add_argument('--since', metavar='DATE', help='Rows processed on or after this date (YYYY-MM-DD)')
+    query.add_argument('--until', metavar='DATE', help='Rows processed on or before this date (YYYY-MM-DD)')
+    return parser.parse_args()
 
 if __name__ == '__main__':
+    args = parse_args()
+
+    if args.validate_rules:
+        sys.exit(validate_rules_file(args.rules))
+
+    if args.query:
+        results = query_reviews(args.sqlite or REVIEW_DB_FILE, args.species, args.rpm, args.file, args.since, args.until)
+        results.to_csv(sys.stdout, index=False)
+        print(f"{len(results)} matching rows", file=sys.stderr)
+        sys.exit(0)
+
+    review_db_path = args.sqlite
+    add_distance_columns = args.distance_columns
+    add_provenance_column = args.provenance
+
+    if args.process_shard or args.merge_shards:
+        try:
+            if args.process_shard:
+                process_shard(args.process_shard, args.output_format, args.rules, args.rules_store,
+                              resume=args.resume, checkpoint_rows=args.checkpoint_rows)
+            else:
+                ensure_output_directory()
+                merge_shards(args.merge_shards)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"\nError: {e}")
+            sys.exit(1)
+        print("Processing completed successfully!")
+        sys.exit(0)
+
+    if args.watch:
+        watch_folder(args.watch, args.output_format, args.rules, args.rules_store, args.workers)
+        sys.exit(0)
+
     print(f"\nStarting species record processing...")
     print(f"Current working directory: {os.getcwd()}")
     
@@ -413,21 +2304,44 @@ if __name__ == '__main__':
         # Handle file based on type
         input_file = selected_file
         if selected_file.endswith('.xlsx'):
-            input_file = convert_xlsx_to_csv(selected_file)
+            record_sheets = find_record_sheets(selected_file)
+            if not record_sheets:
+                print(f"No sheet in {selected_file} has a 'Review Records' column")
+                sys.exit(1)
+
+            # Workbooks with several record sheets are processed sheet by sheet in parallel
+            if len(record_sheets) > 1 and not args.audit and not args.split_shards:
+                if args.resume or args.checkpoint_rows != CHECKPOINT_ROWS:
+                    print("Warning: --resume and --checkpoint-rows do not apply to multi-sheet workbooks; "
+                          "every sheet is processed from the start")
+                ensure_output_directory()
+                process_workbook(selected_file, record_sheets, args.output_format, args.rules, args.rules_store,
+                                 workers=args.workers, combined=args.combined_workbook)
+                print("Processing completed successfully!")
+                sys.exit(0)
+            if len(record_sheets) > 1:
+                print(f"Using the first sheet with a 'Review Records' column: {record_sheets[0]}")
+            input_file = convert_xlsx_to_csv(selected_file, record_sheets[0])
         
         # Create output filename
-        output_filename = os.path.basename(input_file).rsplit('.', 1)[0] + '_processed.csv'
-        output_file = os.path.join(OUTPUT_DIR, output_filename)
+        output_file = get_output_file(input_file, args.output_format)
         
         # Ensure output directory exists
         ensure_output_directory()
+
+        if args.split_shards:
+            split_into_shards(input_file, args.split_shards, args.rules)
+            sys.exit(0)
+
+        if args.audit:
+            audit_file = strip_output_extension(output_file)[:-len('_processed')] + '_audit' + OUTPUT_FORMATS[args.output_format]
+            audit_species_records(input_file, audit_file, args.output_format, args.rules, args.rules_store)
+            sys.exit(0)
         
-        # Process the data
-        result_df = process_species_records(input_file)
-        
-        # Save results
-        print(f"Saving results to: {os.path.abspath(output_file)}")
-        result_df.to_csv(output_file, index=False)
+        # Process the data, checkpointing as we go, and save results
+        process_with_checkpoints(input_file, output_file, args.output_format, args.rules, args.rules_store,
+                                 resume=args.resume, checkpoint_rows=args.checkpoint_rows)
+        write_stats_report(processing_stats, output_file)
         print("Processing completed successfully!")
         
     except FileNotFoundError as e:
@@ -0,0 +1,120 @@
+import argparse
+import importlib.util
+import os
+import random
+import re
+import timeit
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAPPER_FILE = os.path.join(REPO_DIR, 'species-mapper.py')
+RULES_FILE = os.path.join(REPO_DIR, 'rules', 'USFS_MSUP_Class_2.csv')
+PROVENANCE_BATCH_CELLS = 500  # Cells per timed batch in the provenance benchmark
+
+SAMPLE_LINES = [
+    'Pacific fisher - Not within 650-ft of CBI reproductive',
+    'Pacific fisher - Within 650-ft of CBI | USFWS Critical Habitat',
+    'Yosemite Toad - SNF Occupied | USFWS Critical Habitat',
+    'California Spotted Owl - Sierra Nevada DPS - CASPO Warning Layer',
+    'Done - Great Gray Owl - Within 1-mi of USFS/CNDDB occurrence',
+    'DONE - American Marten - within 500 ft of USFS record',
+    'Black-backed woodpecker - Within 1.5-mi USFS',
+    'mountain yellow-legged frog - SNF Unknown occupied',
+    "Bolander's Woodreed - Outside of SNF Mapped Habitat USFS",
+    'steelhead - southern California DPS - Critical Habitat',
+    'Ringtail - Within 1-mi of CNDDB',
+    'adobe lily'
+]
+
+def load_mapper():
+    """Import species-mapper.py as a module"""
+    spec = importlib.util.spec_from_file_location('species_mapper', MAPPER_FILE)
+    mapper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mapper)
+    return mapper
+
+def make_cells(count, seed=0):
+    """Build synthetic Review Records cells, some with Excel line endings"""
+    rng = random.Random(seed)
+    cells = []
+    for idx in range(count):
+        lines = rng.sample(SAMPLE_LINES, rng.randint(1, 6))
+        cells.append(('\r\n' if idx % 4 == 0 else '\n').join(lines))
+    return cells
+
+def legacy_parse_cell(review_records):
+    """The line parsing process_single_record used before tokenize_review_records"""
+    pairs = []
+    for line in review_records.split('\n'):
+        if not line.strip():
+            continue
+        line = re.sub(r'^(?:Done|DONE)\s*-\s*', '', line.strip())
+        if 'California Spotted Owl' in line and ' - ' in line:
+            parts = line.split(' - ')
+            original_species = (parts[0] + ' - ' + parts[1]).strip()
+            location = ' - '.join(parts[2:]) if len(parts) > 2 else ''
+        else:
+            parts = line.split(' - ', 1)
+            if len(parts) == 1:
+                original_species = parts[0].strip()
+                location = ''
+            else:
+                original_species = parts[0].strip()
+                location = parts[1].strip()
+        pairs.append((original_species, location))
+    return pairs
+
+def report(name, seconds, count):
+    """Print one benchmark result line"""
+    print(f"{name:<30} {seconds:8.3f}s  {count / seconds:>12,.0f} cells/s")
+
+def benchmark_tokenizer(mapper, cells, repeat):
+    """Compare tokenize_review_records against the legacy line parsing"""
+    print(f"\nTokenizer: {len(cells)} cells, best of {repeat}")
+    legacy = min(timeit.repeat(lambda: [legacy_parse_cell(c) for c in cells], number=1, repeat=repeat))
+    current = min(timeit.repeat(lambda: [mapper.tokenize_review_records(c) for c in cells], number=1, repeat=repeat))
+    report('legacy parsing', legacy, len(cells))
+    report('tokenize_review_records', current, len(cells))
+    print(f"Speedup: {legacy / current:.2f}x")
+
+def benchmark_provenance(mapper, cells, repeat):
+    """Measure the cost of recording provenance in process_single_record"""
+    print(f"\nProvenance: {len(cells)} cells, best of {repeat}")
+    # Time short batches alternately and keep each batch's best, so a burst of machine load
+    # only costs the batches it lands on
+    batches = [cells[start:start + PROVENANCE_BATCH_CELLS] for start in range(0, len(cells), PROVENANCE_BATCH_CELLS)]
+    disabled = [float('inf')] * len(batches)
+    enabled = [float('inf')] * len(batches)
+    for _ in range(repeat):
+        for index, batch in enumerate(batches):
+            disabled[index] = min(disabled[index], timeit.timeit(
+                lambda: [mapper.process_single_record(c) for c in batch], number=1))
+            enabled[index] = min(enabled[index], timeit.timeit(
+                lambda: [mapper.process_single_record(c, provenance=[]) for c in batch], number=1))
+    disabled = sum(disabled)
+    enabled = sum(enabled)
+    report('provenance disabled', disabled, len(cells))
+    report('provenance enabled', enabled, len(cells))
+    print(f"Overhead: {100 * (enabled - disabled) / disabled:+.1f}%")
+
+BENCHMARKS = {
+    'tokenizer': benchmark_tokenizer,
+    'provenance': benchmark_provenance
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for species-mapper.py')
+    parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--cells', type=int, default=20000, help='Number of synthetic cells')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    mapper = load_mapper()
+    mapper.load_rules(RULES_FILE, verbose=False)
+    cells = make_cells(args.cells)
+
+    for name in args.benchmarks or list(BENCHMARKS):
+        BENCHMARKS[name](mapper, cells, args.repeat)